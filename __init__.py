@@ -10,12 +10,24 @@ if "bpy" in locals():
         if name.startswith(d_name):
             del sys.modules[name]
 
+import time
+
 import bpy
 
 from .modalop import EVENTKEYMAP_OT_Clicker_Addon, keymap_initialize, keymap_remove
-from .uisettings import ClickerPreferences
-from .switchop import OT_Clicker_Modeswitch
-from . import log
+from .uisettings import ClickerPreferences, ModeCycleRule, CLICKER_UL_cycle_rules
+from .diagops import (
+    OT_Clicker_DumpTrace,
+    OT_Clicker_ExportStats,
+    OT_Clicker_ResetStats,
+    OT_Clicker_RecordStart,
+    OT_Clicker_RecordStop,
+    OT_Clicker_Replay,
+    OT_Clicker_ProfileStart,
+    OT_Clicker_ProfileCancel
+)
+from .cycleops import OT_Clicker_CycleRuleAdd, OT_Clicker_CycleRuleRemove, OT_Clicker_CycleRulesReset
+from . import log, modalop, cycleops, diagops, picking, weightsync
 
 ADDON_NAME = __package__.split('.')[-1]
 
@@ -38,24 +50,71 @@ bl_info = {
 '''Addon loading'''
 
 classes = (
+    ModeCycleRule,
     ClickerPreferences,
     EVENTKEYMAP_OT_Clicker_Addon,
-    OT_Clicker_Modeswitch
+    OT_Clicker_DumpTrace,
+    OT_Clicker_ExportStats,
+    OT_Clicker_ResetStats,
+    OT_Clicker_RecordStart,
+    OT_Clicker_RecordStop,
+    OT_Clicker_Replay,
+    OT_Clicker_ProfileStart,
+    OT_Clicker_ProfileCancel,
+    OT_Clicker_CycleRuleAdd,
+    OT_Clicker_CycleRuleRemove,
+    OT_Clicker_CycleRulesReset,
+    CLICKER_UL_cycle_rules
+)
+
+# only the preferences are needed without a UI
+background_classes = (
+    ModeCycleRule,
+    ClickerPreferences,
 )
 
 class_register, class_unregister = bpy.utils.register_classes_factory(classes)
 
+# True if registered without UI, nothing but the preferences is set up then
+background = False
+
 def register():
+    global background
+    background = bpy.app.background
+    if background:
+        # render farm jobs etc. never see a double click
+        for cls in background_classes:
+            bpy.utils.register_class(cls)
+        return
+
+    start = time.perf_counter()
     log.init_logger(ADDON_NAME)
     
+    # the mode switcher is only imported and registered on the first double click
     class_register()
     log.setup_preferences_cb()  # must be after Preferences registered
-    log.info('called')
+    modalop.setup_preferences_cb()
+    diagops.setup_preferences_cb()
+    weightsync.setup_preferences_cb()
+    cycleops.setup_preferences_cb()
     keymap_initialize()
+    log.info('registered in %.1f ms', (time.perf_counter() - start) * 1000.0)
     
 def unregister():
+    if background:
+        for cls in reversed(background_classes):
+            bpy.utils.unregister_class(cls)
+        return
+
     log.info('called')
     keymap_remove()
+    modalop.unload_switcher()
+    picking.unregister()
+    modalop.remove_preferences_cb()
+    diagops.remove_preferences_cb()
+    weightsync.remove_preferences_cb()
+    cycleops.remove_preferences_cb()
+    log.remove_preferences_cb()
     class_unregister()
     log.uninit_logger()
     
@@ -0,0 +1,79 @@
+'''
+Adaptive double click timing, learned from the double clicks the user actually makes.
+
+Only successful double clicks are observed, so the learned values never exceed the
+configured ones: the effective threshold is a percentile of the observations plus a
+margin, capped by the preference.
+'''
+import math
+
+# observations needed before the thresholds are adapted
+MIN_SAMPLES = 20
+# headroom on top of the percentile
+MARGIN = 1.25
+# lower bounds of the effective thresholds
+MIN_CLICK_TIME = 0.15
+MIN_DRAG_PX = 2
+
+
+class BoundedHistogram:
+    ''' fixed bins, all counts are halved when capacity is reached so old observations fade out '''
+    __slots__ = ('bin_width', 'counts', 'total', 'capacity')
+
+    def __init__(self, bin_width: float, bins: int, capacity: int = 500):
+        self.bin_width = bin_width
+        self.counts = [0] * bins
+        self.total = 0
+        self.capacity = capacity
+
+    def add(self, value: float):
+        index = min(len(self.counts) - 1, max(0, int(value / self.bin_width)))
+        self.counts[index] += 1
+        self.total += 1
+        if self.total > self.capacity:
+            self.counts = [count // 2 for count in self.counts]
+            self.total = sum(self.counts)
+
+    def percentile(self, percent: float) -> float:
+        ''' upper edge of the bin containing the percentile '''
+        target = self.total * percent / 100.0
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and cumulative > 0:
+                return (index + 1) * self.bin_width
+        return len(self.counts) * self.bin_width
+
+    def clear(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+
+
+class AdaptiveTiming:
+    def __init__(self):
+        self.enabled = False
+        self.percentile = 95.0
+        # the configured values, upper bounds of the effective ones
+        self.click_detection_time = 0.5
+        self.drag_detection_px = 10
+        # seconds from the first press to the later of the two releases, 10 ms bins up to 2 s
+        self.intervals = BoundedHistogram(0.01, 200)
+        # largest mouse offset from the first press, 1 px bins up to 100 px
+        self.jitter = BoundedHistogram(1.0, 100)
+
+    def observe(self, interval: float, jitter: int):
+        self.intervals.add(interval)
+        self.jitter.add(jitter)
+
+    def effective(self) -> tuple:
+        ''' (click detection time, drag detection px) to use '''
+        if not self.enabled or self.intervals.total < MIN_SAMPLES:
+            return self.click_detection_time, self.drag_detection_px
+        learned_time = max(MIN_CLICK_TIME, self.intervals.percentile(self.percentile) * MARGIN)
+        learned_px = max(MIN_DRAG_PX, math.ceil(self.jitter.percentile(self.percentile) * MARGIN))
+        return (min(self.click_detection_time, learned_time),
+                min(self.drag_detection_px, learned_px))
+
+    def reset(self):
+        self.intervals.clear()
+        self.jitter.clear()
@@ -0,0 +1,652 @@
+'''
+Minimal stand-in for the bpy module, just enough to load the add-on and run its
+operators outside of Blender.
+
+install() has to be called before the add-on package is imported. Operators
+provided by Blender (view3d.select, object.mode_set, ...) are simulated on a
+synthetic scene, see build_scene().
+'''
+import os
+import sys
+import types
+from types import SimpleNamespace
+
+# module objects, filled by install()
+bpy = types.ModuleType('bpy')
+
+
+'''Geometry'''
+
+class Vector(tuple):
+    ''' mathutils.Vector stand-in '''
+    def __new__(cls, values):
+        return tuple.__new__(cls, values)
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def __mul__(self, factor):
+        return Vector(a * factor for a in self)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self, other))
+
+
+# region coordinates of the last view ray, the objects under the cursor are placed along it
+_view_coord = (0, 0)
+
+
+def _region_2d_to_origin_3d(region, rv3d, coord):
+    global _view_coord
+    _view_coord = tuple(coord)
+    return Vector((coord[0], coord[1], 0.0))
+
+
+def _region_2d_to_vector_3d(region, rv3d, coord):
+    return Vector((0.0, 0.0, 1.0))
+
+
+def _location_3d_to_region_2d(region, rv3d, point, default=None):
+    # orthographic view along z
+    return Vector((point.x, point.y))
+
+
+class _Placement:
+    '''
+    matrix_world stand-in: the n-th object under the cursor is centered on the view ray
+    at depth n + 1, all others are off screen.
+    '''
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __matmul__(self, corner):
+        stack = bpy.context.under_cursor
+        if self.obj in stack:
+            x, y = _view_coord
+            z = stack.index(self.obj) + 1
+        else:
+            x, y, z = -10000.0, -10000.0, 1.0
+        return Vector((x + corner[0], y + corner[1], z + corner[2] * 0.1))
+
+
+# unit cube
+_BOUND_BOX = tuple((x, y, z) for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5))
+
+
+'''Properties'''
+
+class _Prop:
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+
+    def default_value(self):
+        if 'default' in self.kwargs:
+            return self.kwargs['default']
+        if self.kind == 'EnumProperty':
+            items = self.kwargs.get('items')
+            return items[0][0] if items else ''
+        if self.kind == 'CollectionProperty':
+            return _Collection(self.kwargs.get('type'))
+        return {'BoolProperty': False, 'IntProperty': 0, 'FloatProperty': 0.0,
+                'StringProperty': ''}.get(self.kind)
+
+
+def _prop_factory(kind):
+    def factory(**kwargs):
+        return _Prop(kind, **kwargs)
+    factory.__name__ = kind
+    return factory
+
+
+class _Collection(list):
+    def __init__(self, item_type):
+        super().__init__()
+        self.item_type = item_type
+
+    def add(self):
+        item = self.item_type()
+        self.append(item)
+        return item
+
+    def remove(self, index):
+        del self[index]
+
+    def clear(self):
+        del self[:]
+
+
+def _annotated_props(cls) -> dict:
+    props = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).get('__annotations__', {}).items():
+            if isinstance(value, _Prop):
+                props[name] = value
+    return props
+
+
+class _PropertyOwner:
+    ''' initializes annotated properties and calls their update callbacks on assignment '''
+
+    def __init__(self, **kwargs):
+        for name, prop in _annotated_props(type(self)).items():
+            object.__setattr__(self, name, prop.default_value())
+        for name, value in kwargs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        prop = _annotated_props(type(self)).get(name)
+        if prop is not None and prop.kwargs.get('update'):
+            prop.kwargs['update'](self, bpy.context)
+
+
+class Operator(_PropertyOwner):
+    def report(self, level, message):
+        pass
+
+
+class AddonPreferences(_PropertyOwner):
+    layout = None
+
+
+class PropertyGroup(_PropertyOwner):
+    pass
+
+
+class UIList:
+    pass
+
+
+'''Scene data'''
+
+class Modifier:
+    def __init__(self, type, object=None):
+        self.type = type
+        self.object = object
+
+
+class VertexGroup:
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+
+class VertexGroups(list):
+    active_index = 0
+
+    def new(self, name='Group'):
+        group = VertexGroup(name, len(self))
+        self.append(group)
+        return group
+
+    def get(self, name, default=None):
+        for group in self:
+            if group.name == name:
+                return group
+        return default
+
+
+class Object:
+    _pointer = 0x1000
+
+    def __init__(self, name, type='MESH'):
+        Object._pointer += 0x100
+        self.pointer = Object._pointer
+        self.name = name
+        self.type = type
+        self.mode = 'OBJECT'
+        self.modifiers = []
+        self.vertex_groups = VertexGroups()
+        self.data = SimpleNamespace(name=name, bones=SimpleNamespace(active=None))
+        self.select = False
+        self.hidden = False
+        self.hide_select = False
+        self.original = self
+        self.matrix_world = _Placement(self)
+        self.bound_box = _BOUND_BOX
+
+    def __repr__(self):
+        return f"bpy.data.objects['{self.name}']"
+
+    def as_pointer(self):
+        return self.pointer
+
+    def select_get(self):
+        return self.select
+
+    def select_set(self, state):
+        self.select = bool(state)
+
+    def hide_get(self):
+        return self.hidden
+
+    def visible_get(self, view_layer=None, viewport=None):
+        return not self.hidden
+
+
+class _RemovedObject(Object):
+    ''' like a Python reference to a deleted Blender object '''
+    def __getattribute__(self, name):
+        raise ReferenceError("StructRNA of type Object has been removed")
+
+    def __repr__(self):
+        return '<bpy_struct, Object invalid>'
+
+
+class ViewLayerObjects(list):
+    active = None
+
+
+class Workspace(dict):
+    ''' dict part stands for the ID properties '''
+
+    def __init__(self, name='Layout', object_mode='OBJECT'):
+        super().__init__()
+        self.name = name
+        self.object_mode = object_mode
+
+    def status_text_set(self, text):
+        self.status_text = text
+
+
+class Area:
+    def __init__(self, x=0, y=0, width=1920, height=1080):
+        self.type = 'VIEW_3D'
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.regions = [SimpleNamespace(type='WINDOW', x=x, y=y, width=width, height=height,
+                                        data=SimpleNamespace())]
+        self.spaces = SimpleNamespace(active=SimpleNamespace(region_3d=SimpleNamespace()))
+
+
+class KeyMapItems(list):
+    def new(self, idname, type, value, **kwargs):
+        item = SimpleNamespace(idname=idname, type=type, value=value, active=True, **kwargs)
+        self.append(item)
+        return item
+
+
+class KeyMaps(list):
+    def new(self, name, space_type='EMPTY', **kwargs):
+        for keymap in self:
+            if keymap.name == name:
+                return keymap
+        keymap = SimpleNamespace(name=name, space_type=space_type, keymap_items=KeyMapItems())
+        self.append(keymap)
+        return keymap
+
+
+class Window:
+    _pointer = 0x100
+
+    def __init__(self, workspace, screen):
+        Window._pointer += 0x10
+        self.pointer = Window._pointer
+        self.workspace = workspace
+        self.screen = screen
+        self.cursor = 'DEFAULT'
+
+    def as_pointer(self):
+        return self.pointer
+
+    def cursor_modal_set(self, cursor):
+        self.cursor = cursor
+
+    def cursor_modal_restore(self):
+        self.cursor = 'DEFAULT'
+
+
+class Context:
+    def __init__(self):
+        self.preferences = SimpleNamespace(addons={})
+        keyconfigs = SimpleNamespace(addon=SimpleNamespace(keymaps=KeyMaps()))
+        area = Area()
+        self.area = area
+        self.region = area.regions[0]
+        self.screen = SimpleNamespace(areas=[area])
+        self.workspace = Workspace()
+        self.window = Window(self.workspace, self.screen)
+        self.window_manager = SimpleNamespace(keyconfigs=keyconfigs, windows=[self.window])
+        self.view_layer = SimpleNamespace(objects=ViewLayerObjects(), as_pointer=lambda: 0x500)
+        self.scene = Scene(self)
+        self.active_pose_bone = None
+        # ordered objects under the cursor, front to back, used by the picking operators
+        self.under_cursor = []
+
+    @property
+    def active_object(self):
+        return self.view_layer.objects.active
+
+    @property
+    def selected_objects(self):
+        # like Blender, a new list is built on every access
+        return [obj for obj in self.view_layer.objects if obj.select]
+
+    def evaluated_depsgraph_get(self):
+        return SimpleNamespace(updates=[])
+
+    def temp_override(self, **kwargs):
+        return _NullContext()
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Scene:
+    ''' the view ray is one dimensional, the n-th object under the cursor is hit at depth n + 1 '''
+
+    # object types with geometry the ray can hit
+    RAYCAST_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META'}
+
+    def __init__(self, context):
+        self.context = context
+        self.objects = context.view_layer.objects
+
+    def ray_cast(self, depsgraph, origin, direction, distance=1.70141e+38):
+        _count('scene.ray_cast')
+        for depth, obj in enumerate(self.context.under_cursor, 1):
+            if depth > origin.z and obj.type in self.RAYCAST_TYPES:
+                return True, Vector((origin.x, origin.y, float(depth))), None, 0, obj, obj.matrix_world
+        return False, None, None, -1, None, None
+
+
+def build_scene(context, objects=10, selected=0, modifiers=0, vertex_groups=0, under_cursor=2):
+    '''
+    Fill the view layer with meshes, one armature deforming the first mesh.
+    The first mesh gets the modifiers and vertex groups, the first under_cursor
+    meshes are stacked at the click position.
+    '''
+    view_objects = context.view_layer.objects
+    for obj in view_objects:
+        obj.__class__ = _RemovedObject
+    view_objects.clear()
+    view_objects.active = None
+
+    armature = Object('Armature', 'ARMATURE')
+    view_objects.append(armature)
+    for index in range(objects):
+        view_objects.append(Object(f'Mesh.{index:05d}'))
+
+    meshes = view_objects[1:]
+    heavy = meshes[0]
+    for index in range(modifiers):
+        heavy.modifiers.append(Modifier('SUBSURF' if index % 2 else 'WEIGHTED_NORMAL'))
+    if modifiers:
+        heavy.modifiers.append(Modifier('ARMATURE', armature))
+    for index in range(vertex_groups):
+        heavy.vertex_groups.new(f'Bone.{index:05d}')
+
+    for obj in meshes[:selected]:
+        obj.select_set(True)
+    if selected:
+        view_objects.active = meshes[0]
+
+    context.under_cursor = meshes[:under_cursor]
+    context.active_pose_bone = SimpleNamespace(name=f'Bone.{vertex_groups - 1:05d}') if vertex_groups else None
+    return view_objects
+
+
+'''Operators'''
+
+_registered = {}
+
+
+class _OpsSubmodule:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        idname = f'{self._name}.{name}'
+        operator = _registered.get(idname) or _builtin_ops.get(idname)
+        if operator is None:
+            raise AttributeError(idname)
+        return operator
+
+
+class _Ops:
+    def __getattr__(self, name):
+        return _OpsSubmodule(name)
+
+
+class _RegisteredOperator:
+    def __init__(self, cls):
+        self.cls = cls
+
+    def __call__(self, *args, **kwargs):
+        operator = self.cls(**kwargs)
+        if args and args[0] == 'INVOKE_DEFAULT' and hasattr(operator, 'invoke'):
+            return operator.invoke(bpy.context, None)
+        return operator.execute(bpy.context)
+
+
+# counts calls of the simulated Blender operators
+op_calls = {}
+
+
+def _count(idname):
+    op_calls[idname] = op_calls.get(idname, 0) + 1
+
+
+def _op_select(location=(0, 0), deselect_all=False, object=False, **kwargs):
+    _count('view3d.select')
+    context = bpy.context
+    stack = context.under_cursor
+    if deselect_all:
+        for obj in context.view_layer.objects:
+            obj.select = False
+    if not stack:
+        return {'CANCELLED'}
+    # cycle through overlapping objects like repeated clicks in Blender
+    active = context.view_layer.objects.active
+    index = (stack.index(active) + 1) % len(stack) if active in stack else 0
+    stack[index].select_set(True)
+    context.view_layer.objects.active = stack[index]
+    return {'FINISHED'}
+
+
+def _op_mode_set(mode='OBJECT', **kwargs):
+    _count('object.mode_set')
+    context = bpy.context
+    active = context.view_layer.objects.active
+    if active is None:
+        return {'CANCELLED'}
+    # leaving a multi object mode exits all objects in it
+    old_mode = active.mode
+    if old_mode in ('EDIT', 'POSE'):
+        for obj in context.view_layer.objects:
+            if obj.mode == old_mode and obj.type == active.type:
+                obj.mode = 'OBJECT'
+    active.mode = 'OBJECT'
+    if mode == 'OBJECT':
+        return {'FINISHED'}
+
+    targets = [active]
+    if mode in ('EDIT', 'POSE'):
+        # multi object editing includes the selected objects of the same type
+        targets += [obj for obj in context.view_layer.objects
+                    if obj.select and obj.type == active.type and obj is not active]
+    for obj in targets:
+        obj.mode = mode
+    return {'FINISHED'}
+
+
+def _op_count(idname):
+    def operator(*args, **kwargs):
+        _count(idname)
+        return {'FINISHED'}
+    return operator
+
+
+_builtin_ops = {
+    'view3d.select': _op_select,
+    'view3d.rotate': _op_count('view3d.rotate'),
+    'view3d.move': _op_count('view3d.move'),
+    'object.mode_set': _op_mode_set,
+    'ed.undo_push': _op_count('ed.undo_push'),
+}
+
+
+def register_class(cls):
+    if issubclass(cls, AddonPreferences):
+        bpy.context.preferences.addons[cls.bl_idname] = SimpleNamespace(preferences=cls())
+    elif issubclass(cls, Operator):
+        _registered[cls.bl_idname] = _RegisteredOperator(cls)
+
+
+def unregister_class(cls):
+    if issubclass(cls, Operator):
+        _registered.pop(cls.bl_idname, None)
+
+
+def register_classes_factory(classes):
+    def register():
+        for cls in classes:
+            register_class(cls)
+
+    def unregister():
+        for cls in reversed(classes):
+            unregister_class(cls)
+    return register, unregister
+
+
+'''Application'''
+
+class _Timers:
+    ''' timers only run when run_timers() is called '''
+
+    def __init__(self):
+        self.functions = {}
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self.functions[function] = first_interval
+
+    def unregister(self, function):
+        self.functions.pop(function, None)
+
+    def is_registered(self, function):
+        return function in self.functions
+
+
+def run_timers():
+    timers = bpy.app.timers
+    for function in list(timers.functions):
+        if function in timers.functions:
+            interval = function()
+            if interval is None:
+                timers.functions.pop(function, None)
+            else:
+                timers.functions[function] = interval
+
+
+def _persistent(function):
+    return function
+
+
+def install():
+    ''' register the fake modules in sys.modules, returns the bpy module '''
+    if sys.modules.get('bpy') is bpy:
+        return bpy
+
+    bpy.types = types.ModuleType('bpy.types')
+    for name in ('Context', 'Event', 'UILayout', 'Depsgraph', 'Scene', 'ArmatureBones'):
+        setattr(bpy.types, name, type(name, (), {}))
+    bpy.types.Operator = Operator
+    bpy.types.AddonPreferences = AddonPreferences
+    bpy.types.PropertyGroup = PropertyGroup
+    bpy.types.UIList = UIList
+    bpy.types.Object = Object
+    bpy.types.Window = Window
+
+    bpy.props = types.ModuleType('bpy.props')
+    for kind in ('BoolProperty', 'IntProperty', 'FloatProperty', 'EnumProperty',
+                 'StringProperty', 'CollectionProperty', 'PointerProperty'):
+        setattr(bpy.props, kind, _prop_factory(kind))
+
+    bpy.utils = types.ModuleType('bpy.utils')
+    bpy.utils.register_class = register_class
+    bpy.utils.unregister_class = unregister_class
+    bpy.utils.register_classes_factory = register_classes_factory
+
+    bpy.ops = _Ops()
+    bpy.context = Context()
+    bpy.data = SimpleNamespace(workspaces={bpy.context.workspace.name: bpy.context.workspace},
+                               objects=bpy.context.view_layer.objects)
+    bpy.app = types.ModuleType('bpy.app')
+    bpy.app.background = False
+    bpy.app.version = (4, 2, 0)
+    bpy.app.timers = _Timers()
+    bpy.path = SimpleNamespace(abspath=os.path.abspath)
+    bpy.app.handlers = types.ModuleType('bpy.app.handlers')
+    bpy.app.handlers.persistent = _persistent
+    for name in ('depsgraph_update_post', 'load_post', 'save_pre', 'undo_post', 'redo_post'):
+        setattr(bpy.app.handlers, name, [])
+    bpy.msgbus = SimpleNamespace(
+        subscribe_rna=lambda **kwargs: None, clear_by_owner=lambda owner: None)
+
+    bpy_extras = types.ModuleType('bpy_extras')
+    bpy_extras.io_utils = types.ModuleType('bpy_extras.io_utils')
+    bpy_extras.io_utils.ExportHelper = type('ExportHelper', (), {'filepath': ''})
+    bpy_extras.io_utils.ImportHelper = type('ImportHelper', (), {'filepath': ''})
+    bpy_extras.view3d_utils = types.ModuleType('bpy_extras.view3d_utils')
+    bpy_extras.view3d_utils.region_2d_to_origin_3d = _region_2d_to_origin_3d
+    bpy_extras.view3d_utils.region_2d_to_vector_3d = _region_2d_to_vector_3d
+    bpy_extras.view3d_utils.location_3d_to_region_2d = _location_3d_to_region_2d
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.Vector = Vector
+
+    sys.modules.update({
+        'bpy': bpy,
+        'bpy.types': bpy.types,
+        'bpy.props': bpy.props,
+        'bpy.utils': bpy.utils,
+        'bpy.app': bpy.app,
+        'bpy.app.handlers': bpy.app.handlers,
+        'bpy_extras': bpy_extras,
+        'bpy_extras.io_utils': bpy_extras.io_utils,
+        'bpy_extras.view3d_utils': bpy_extras.view3d_utils,
+        'mathutils': mathutils,
+    })
+    return bpy
+
+
+def keymap_dispatch(operator, context, events) -> int:
+    ''' call operator.invoke for the events an active add-on keymap item matches, returns the calls '''
+    calls = 0
+    for event in events:
+        for keymap in context.window_manager.keyconfigs.addon.keymaps:
+            if any(item.active and item.type == event.type for item in keymap.keymap_items):
+                operator.invoke(context, event)
+                calls += 1
+                break
+    return calls
+
+
+class Event:
+    __slots__ = ('type', 'value', 'mouse_x', 'mouse_y', 'shift', 'ctrl', 'alt', 'oskey')
+
+    def __init__(self, type, value='NOTHING', mouse_x=0, mouse_y=0,
+                 shift=False, ctrl=False, alt=False, oskey=False):
+        self.type = type
+        self.value = value
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+        self.shift = shift
+        self.ctrl = ctrl
+        self.alt = alt
+        self.oskey = oskey
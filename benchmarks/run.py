@@ -0,0 +1,298 @@
+'''
+Offline benchmarks of the add-on against the fake bpy module.
+
+    python benchmarks/run.py [--quick] [--output result.json] [--compare baseline.json]
+                             [--replay session.mmbrec]
+
+Results are written as JSON with the median and interquartile range of the
+repeats. --compare reports the change against an earlier run and exits with 1 if
+a benchmark got slower by more than --threshold percent and more than the noise,
+the sum of both interquartile ranges.
+'''
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(HERE)
+PACKAGE = 'mmb_clicker'
+
+sys.path.insert(0, HERE)
+import fakebpy  # noqa: E402
+
+
+def load_addon():
+    fakebpy.install()
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(ADDON_DIR, '__init__.py'), submodule_search_locations=[ADDON_DIR])
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = addon
+    spec.loader.exec_module(addon)
+    addon.register()
+    # normally imported on the first double click
+    sys.modules[f'{PACKAGE}.modalop'].load_switcher()
+    return addon
+
+
+def module(name):
+    return sys.modules[f'{PACKAGE}.{name}']
+
+
+'''Per event overhead'''
+
+def idle_events(count):
+    Event = fakebpy.Event
+    return [Event('MOUSEMOVE', 'NOTHING', 100 + i % 500, 200 + i % 300) for i in range(count)]
+
+
+def gesture_events(count):
+    ''' press/release/press/drag navigation gestures and press/drag rotations, between mouse moves '''
+    Event = fakebpy.Event
+    pattern = [
+        Event('MOUSEMOVE', 'NOTHING', 100, 100),
+        Event('MIDDLEMOUSE', 'PRESS', 100, 100),
+        Event('MIDDLEMOUSE', 'RELEASE', 101, 100),
+        Event('MOUSEMOVE', 'NOTHING', 102, 101),
+        Event('MIDDLEMOUSE', 'PRESS', 102, 101),
+        Event('MOUSEMOVE', 'NOTHING', 105, 103),
+        Event('MOUSEMOVE', 'NOTHING', 150, 130),   # drag -> view3d.move
+        Event('MOUSEMOVE', 'NOTHING', 160, 140),
+        Event('MIDDLEMOUSE', 'PRESS', 160, 140),
+        Event('MOUSEMOVE', 'NOTHING', 200, 180),   # drag -> view3d.rotate
+        Event('MOUSEMOVE', 'NOTHING', 210, 190),
+        Event('MOUSEMOVE', 'NOTHING', 220, 200),
+    ]
+    return (pattern * (count // len(pattern) + 1))[:count]
+
+
+def summarize(samples) -> tuple:
+    ''' (median, interquartile range) '''
+    if len(samples) < 2:
+        return samples[0], 0.0
+    q1, median, q3 = statistics.quantiles(samples, n=4)
+    return median, q3 - q1
+
+
+def bench_invoke(events, repeat):
+    modalop = module('modalop')
+    operator = modalop.EVENTKEYMAP_OT_Clicker_Addon()
+    context = fakebpy.bpy.context
+    invoke = operator.invoke
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for event in events:
+            invoke(context, event)
+        samples.append((time.perf_counter() - start) / len(events) * 1e9)
+    return summarize(samples)
+
+
+def bench_replay(filepath, repeat):
+    ''' gesture engine over a recorded session, with the recorded timing '''
+    recorder = module('recorder')
+    modalop = module('modalop')
+    recording = recorder.EventRecording.load(filepath)
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        counts = recorder.replay(recording, modalop.settings)
+        samples.append((time.perf_counter() - start) / max(1, len(recording)) * 1e9)
+    return summarize(samples), counts
+
+
+'''Mode switch'''
+
+def setup_click_other(context, size):
+    ''' active mesh in OBJECT mode, double click on another mesh '''
+    fakebpy.build_scene(context, objects=size['objects'], selected=1)
+    context.under_cursor = [context.view_layer.objects[5]]
+
+
+def setup_click_other_speculated(context, size):
+    ''' like switch_click_other, with the pick already made by the gesture operator '''
+    setup_click_other(context, size)
+    module('picking').speculate(context, context.window.as_pointer(), context.screen.areas[0], 500, 400)
+
+
+def setup_click_selected(context, size):
+    ''' thousands selected, double click on one of them '''
+    fakebpy.build_scene(context, objects=size['objects'], selected=size['selected'])
+    context.under_cursor = [context.view_layer.objects[3]]
+
+
+def setup_click_overlapping(context, size):
+    ''' active mesh behind five other meshes '''
+    objects = fakebpy.build_scene(context, objects=size['objects'], selected=1)
+    context.under_cursor = objects[2:7] + [objects.active]
+
+
+def setup_click_armature_in_front(context, size):
+    ''' nothing selected, double click on the armature drawn in front of a mesh '''
+    objects = fakebpy.build_scene(context, objects=size['objects'])
+    context.under_cursor = [objects[0], objects[5]]
+
+
+def setup_heavy_weight_paint(context, size):
+    ''' heavy mesh in EDIT, cycles to WEIGHT_PAINT through its armature modifier '''
+    objects = fakebpy.build_scene(context, objects=size['objects'], selected=1,
+                                  modifiers=size['modifiers'], vertex_groups=size['vertex_groups'])
+    objects.active.mode = 'EDIT'
+    context.under_cursor = [objects.active]
+
+
+def setup_click_empty(context, size):
+    ''' active mesh in EDIT, double click on empty space '''
+    objects = fakebpy.build_scene(context, objects=size['objects'], selected=size['selected'])
+    objects.active.mode = 'EDIT'
+    context.under_cursor = []
+
+
+SWITCH_SCENARIOS = {
+    'switch_click_other': setup_click_other,
+    'switch_click_other_speculated': setup_click_other_speculated,
+    'switch_click_selected': setup_click_selected,
+    'switch_click_overlapping': setup_click_overlapping,
+    'switch_click_armature_in_front': setup_click_armature_in_front,
+    'switch_heavy_weight_paint': setup_heavy_weight_paint,
+    'switch_click_empty': setup_click_empty,
+}
+
+
+def bench_switch(setup, size, repeat):
+    switchop = module('switchop')
+    context = fakebpy.bpy.context
+    timings = []
+    calls = {}
+    for _ in range(repeat):
+        setup(context, size)
+        context.workspace.clear()
+        fakebpy.op_calls.clear()
+        operator = switchop.OT_Clicker_Modeswitch(mouse_x=500, mouse_y=400)
+        gc.collect()
+        start = time.perf_counter()
+        operator.execute(context)
+        timings.append((time.perf_counter() - start) * 1e3)
+        calls = dict(fakebpy.op_calls)
+    return summarize(timings), calls
+
+
+'''Driver'''
+
+# many short repeats rather than a few long ones, the spread of the repeats is the noise
+SIZES = {
+    'full': {'idle_events': 200_000, 'gesture_events': 100_000, 'event_repeat': 21,
+             'objects': 10_000, 'selected': 3_000, 'modifiers': 300, 'vertex_groups': 2_000,
+             'switch_repeat': 51},
+    'quick': {'idle_events': 50_000, 'gesture_events': 25_000, 'event_repeat': 11,
+              'objects': 2_000, 'selected': 500, 'modifiers': 100, 'vertex_groups': 500,
+              'switch_repeat': 21},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ADDON_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size_name, replay=None):
+    size = SIZES[size_name]
+    load_addon()
+    results = {}
+
+    value, spread = bench_invoke(idle_events(size['idle_events']), size['event_repeat'])
+    results['invoke_idle_mousemove'] = {'value': value, 'spread': spread, 'unit': 'ns/event'}
+    value, spread = bench_invoke(gesture_events(size['gesture_events']), size['event_repeat'])
+    results['invoke_gesture_mix'] = {'value': value, 'spread': spread, 'unit': 'ns/event'}
+
+    # how many idle mouse moves reach the operator through the keymap at all
+    events = idle_events(size['idle_events'] // 10)
+    calls = fakebpy.keymap_dispatch(
+        module('modalop').EVENTKEYMAP_OT_Clicker_Addon(), fakebpy.bpy.context, events)
+    results['keymap_idle_mousemove_calls'] = {'value': calls / len(events), 'spread': 0.0,
+                                              'unit': 'calls/event'}
+
+    if replay:
+        (value, spread), counts = bench_replay(replay, size['event_repeat'])
+        results['replay_' + os.path.splitext(os.path.basename(replay))[0]] = {
+            'value': value, 'spread': spread, 'unit': 'ns/event', 'gestures': counts}
+
+    for name, setup in SWITCH_SCENARIOS.items():
+        (value, spread), calls = bench_switch(setup, size, size['switch_repeat'])
+        results[name] = {'value': value, 'spread': spread, 'unit': 'ms/switch', 'operator_calls': calls}
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'size': size_name,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    old_results = baseline.get('results', {})
+    for name, result in current['results'].items():
+        old = old_results.get(name)
+        if old is None or not old['value']:
+            print(f"{name:30s} {result['value']:12.3f} {result['unit']:10s} (new)")
+            continue
+        difference = result['value'] - old['value']
+        change = difference / old['value'] * 100.0
+        # older results without a spread count as noise free
+        noise = result.get('spread', 0.0) + old.get('spread', 0.0)
+        flag = ''
+        if change > threshold and difference > noise:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:30s} {result['value']:12.3f} {result['unit']:10s} {change:+7.1f}%"
+              f"  noise {noise / old['value'] * 100.0:5.1f}%{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller workloads')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    parser.add_argument('--replay', help='also time the gesture engine on this event recording')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='allowed slowdown in percent when comparing (default 10)')
+    args = parser.parse_args(argv)
+
+    current = run('quick' if args.quick else 'full', args.replay)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        return 1 if regressions else 0
+
+    for name, result in current['results'].items():
+        details = result.get('operator_calls') or result.get('gestures')
+        suffix = f"  {details}" if details else ''
+        print(f"{name:30s} {result['value']:12.3f} iqr {result['spread']:<9.3f} {result['unit']}{suffix}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+from bpy.types import Operator
+
+from . import cycles, log
+from .uisettings import ClickerPreferences, property_updated
+
+
+def cycle_rules_cb(rules):
+    # without own rules the built-in ones are used
+    if rules:
+        cycles.compile_rules([rule.as_tuple() for rule in rules])
+    else:
+        cycles.compile_rules(cycles.DEFAULT_RULES)
+    log.debug("Mode cycles compiled, %d entries", len(cycles.table))
+
+
+def setup_preferences_cb():
+    ClickerPreferences.register_callback('cycle_rules', cycle_rules_cb)
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('cycle_rules', cycle_rules_cb)
+    cycles.compile_rules(cycles.DEFAULT_RULES)
+
+
+class OT_Clicker_CycleRuleAdd(Operator):
+    bl_idname = "wm.clicker_cycle_rule_add"
+    bl_label = "Add Mode Cycle Rule"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        prefs = ClickerPreferences.get_instance(context)
+        rule = prefs.cycle_rules.add()
+        active = prefs.cycle_rules_index
+        if 0 <= active < len(prefs.cycle_rules) - 1:
+            # start from a copy of the selected rule
+            rule.set_from(prefs.cycle_rules[active].as_tuple())
+        prefs.cycle_rules_index = len(prefs.cycle_rules) - 1
+        property_updated(prefs, 'cycle_rules')
+        return {'FINISHED'}
+
+
+class OT_Clicker_CycleRuleRemove(Operator):
+    bl_idname = "wm.clicker_cycle_rule_remove"
+    bl_label = "Remove Mode Cycle Rule"
+    bl_description = "Remove the selected rule, without any rules the built-in cycles are used"
+    bl_options = {'INTERNAL'}
+
+    @classmethod
+    def poll(cls, context):
+        prefs = ClickerPreferences.get_instance(context)
+        return 0 <= prefs.cycle_rules_index < len(prefs.cycle_rules)
+
+    def execute(self, context):
+        prefs = ClickerPreferences.get_instance(context)
+        prefs.cycle_rules.remove(prefs.cycle_rules_index)
+        prefs.cycle_rules_index = min(prefs.cycle_rules_index, len(prefs.cycle_rules) - 1)
+        property_updated(prefs, 'cycle_rules')
+        return {'FINISHED'}
+
+
+class OT_Clicker_CycleRulesReset(Operator):
+    bl_idname = "wm.clicker_cycle_rules_reset"
+    bl_label = "Reset Mode Cycles"
+    bl_description = "Replace the rules with editable copies of the built-in cycles"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        prefs = ClickerPreferences.get_instance(context)
+        prefs.cycle_rules.clear()
+        for values in cycles.DEFAULT_RULES:
+            prefs.cycle_rules.add().set_from(values)
+        prefs.cycle_rules_index = 0
+        property_updated(prefs, 'cycle_rules')
+        return {'FINISHED'}
@@ -0,0 +1,130 @@
+'''
+Mode cycle rules and their compiled lookup table.
+
+A rule switches objects of one type from one mode to the next, optionally only in one
+workspace mode and only with or without an armature modifier. The rules are compiled
+into a flat table, resolving the next mode is then a single dict lookup.
+'''
+
+ANY = 'ANY'
+WITH = 'WITH'
+WITHOUT = 'WITHOUT'
+
+OBJECT_TYPES = ('MESH', 'ARMATURE', 'CURVE', 'CURVES', 'SURFACE', 'LATTICE', 'GPENCIL',
+                'GREASEPENCIL', 'META', 'FONT', 'POINTCLOUD')
+MODES = ('OBJECT', 'EDIT', 'POSE', 'SCULPT', 'VERTEX_PAINT', 'WEIGHT_PAINT', 'TEXTURE_PAINT',
+         'PARTICLE_EDIT', 'SCULPT_CURVES', 'EDIT_GPENCIL', 'SCULPT_GPENCIL', 'PAINT_GPENCIL',
+         'WEIGHT_GPENCIL', 'VERTEX_GPENCIL', 'PAINT_GREASE_PENCIL', 'SCULPT_GREASE_PENCIL',
+         'WEIGHT_GREASE_PENCIL', 'VERTEX_GREASE_PENCIL')
+# workspace object_mode uses the same names
+WORKSPACE_MODES = (ANY,) + MODES
+ARMATURE_OPTIONS = (ANY, WITH, WITHOUT)
+
+# (workspace mode, object type, from mode, to mode, armature)
+DEFAULT_RULES = (
+    (ANY, 'MESH', 'OBJECT', 'EDIT', ANY),
+    (ANY, 'MESH', 'EDIT', 'WEIGHT_PAINT', WITH),
+    (ANY, 'MESH', 'EDIT', 'OBJECT', WITHOUT),
+    (ANY, 'MESH', 'WEIGHT_PAINT', 'EDIT', ANY),
+    (ANY, 'ARMATURE', 'OBJECT', 'POSE', ANY),
+    (ANY, 'ARMATURE', 'POSE', 'EDIT', ANY),
+    (ANY, 'ARMATURE', 'EDIT', 'POSE', ANY),
+    (ANY, 'CURVE', 'OBJECT', 'EDIT', ANY),
+    (ANY, 'SURFACE', 'OBJECT', 'EDIT', ANY),
+    (ANY, 'LATTICE', 'OBJECT', 'EDIT', ANY),
+    (ANY, 'CURVES', 'OBJECT', 'SCULPT_CURVES', ANY),
+    (ANY, 'CURVES', 'SCULPT_CURVES', 'EDIT', ANY),
+    (ANY, 'CURVES', 'EDIT', 'SCULPT_CURVES', ANY),
+    (ANY, 'GPENCIL', 'OBJECT', 'PAINT_GPENCIL', ANY),
+    (ANY, 'GPENCIL', 'PAINT_GPENCIL', 'EDIT_GPENCIL', ANY),
+    (ANY, 'GPENCIL', 'EDIT_GPENCIL', 'PAINT_GPENCIL', ANY),
+    (ANY, 'GREASEPENCIL', 'OBJECT', 'PAINT_GREASE_PENCIL', ANY),
+    (ANY, 'GREASEPENCIL', 'PAINT_GREASE_PENCIL', 'EDIT', ANY),
+    (ANY, 'GREASEPENCIL', 'EDIT', 'PAINT_GREASE_PENCIL', ANY),
+    ('SCULPT', 'MESH', 'OBJECT', 'SCULPT', ANY),
+    ('SCULPT', 'MESH', 'SCULPT', 'EDIT', ANY),
+    ('SCULPT', 'MESH', 'EDIT', 'SCULPT', ANY),
+    ('TEXTURE_PAINT', 'MESH', 'OBJECT', 'TEXTURE_PAINT', ANY),
+    ('TEXTURE_PAINT', 'MESH', 'TEXTURE_PAINT', 'VERTEX_PAINT', ANY),
+    ('TEXTURE_PAINT', 'MESH', 'VERTEX_PAINT', 'TEXTURE_PAINT', ANY),
+)
+
+# (workspace mode, object type, current mode, has armature) -> next mode
+table = {}
+# workspace modes with rules of their own, all others use the ANY rules
+workspace_overrides = set()
+# (workspace mode, object type) having rules
+cycled_types = set()
+# (workspace mode, object type, current mode) where the armature changes the next mode
+armature_dependent = set()
+# object type -> modes only entered with an armature
+armature_modes = {}
+
+
+def compile_rules(rules):
+    '''
+    Build the lookup table, rules are (workspace mode, object type, from, to, armature) tuples.
+    Rules of a workspace mode replace the ANY rules of that object type, rules for
+    with or without armature override ANY armature rules, later rules override earlier ones.
+    '''
+    grouped = {}
+    for rule in rules:
+        grouped.setdefault(rule[0], {}).setdefault(rule[1], []).append(rule)
+    general = grouped.get(ANY, {})
+
+    new_table = {}
+    new_cycled = set()
+    new_dependent = set()
+    new_armature_modes = {}
+    for ws_mode, own in grouped.items():
+        by_type = dict(general)
+        by_type.update(own)
+        for obj_type, type_rules in by_type.items():
+            new_cycled.add((ws_mode, obj_type))
+            # stable sort, the ANY armature rules first so the specific ones override them
+            ordered = sorted(type_rules, key=lambda rule: rule[4] != ANY)
+            for has_armature in (True, False):
+                for _, _, from_mode, to_mode, armature in ordered:
+                    if armature == ANY or (armature == WITH) == has_armature:
+                        new_table[(ws_mode, obj_type, from_mode, has_armature)] = to_mode
+            for _, _, from_mode, to_mode, armature in type_rules:
+                if new_table.get((ws_mode, obj_type, from_mode, True)) != \
+                        new_table.get((ws_mode, obj_type, from_mode, False)):
+                    new_dependent.add((ws_mode, obj_type, from_mode))
+                if armature == WITH:
+                    new_armature_modes.setdefault(obj_type, set()).add(to_mode)
+
+    global table, cycled_types, armature_dependent, armature_modes
+    table = new_table
+    cycled_types = new_cycled
+    armature_dependent = new_dependent
+    armature_modes = new_armature_modes
+    workspace_overrides.clear()
+    workspace_overrides.update(mode for mode in grouped if mode != ANY)
+
+
+def next_mode(ws_mode: str, obj, current_mode: str, cycle_to_next: bool, armature_of):
+    '''
+    Mode to switch obj to, None if its type has no rules or the mode has no successor.
+    Without cycle_to_next current_mode is restored, unless it needs an armature obj lacks.
+    armature_of(obj) is only called if the armature makes a difference.
+    '''
+    if ws_mode not in workspace_overrides:
+        ws_mode = ANY
+    obj_type = obj.type
+    if (ws_mode, obj_type) not in cycled_types:
+        return None  # lamps etc.
+
+    if cycle_to_next:
+        has_armature = (ws_mode, obj_type, current_mode) in armature_dependent and \
+            armature_of(obj) is not None
+        return table.get((ws_mode, obj_type, current_mode, has_armature))
+
+    if current_mode in armature_modes.get(obj_type, ()) and armature_of(obj) is None:
+        # continue the way the cycle does without an armature
+        return table.get((ws_mode, obj_type, current_mode, False)) or \
+            table.get((ANY, obj_type, current_mode, False))
+    return current_mode
+
+
+compile_rules(DEFAULT_RULES)
@@ -0,0 +1,172 @@
+import os
+import tempfile
+
+import bpy
+from bpy.types import Operator
+from bpy.props import (
+    FloatProperty,
+    IntProperty,
+    StringProperty
+)
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+
+from . import log, profiler, recorder, stats
+from .uisettings import ClickerPreferences
+
+
+def setup_preferences_cb():
+    ClickerPreferences.register_callback('collect_stats', stats.set_enabled)
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('collect_stats', stats.set_enabled)
+    stats.set_enabled(False)
+    profiler.cancel()
+
+
+class OT_Clicker_DumpTrace(Operator):
+    bl_idname = "wm.clicker_dump_trace"
+    bl_label = "Dump Gesture Trace"
+    bl_description = "Print the last recorded gesture transitions to the console"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        lines = log.format_trace()
+        print(f"mmb-clicker: last {len(lines)} gesture transitions")
+        for line in lines:
+            print(line)
+        self.report({'INFO'}, f"{len(lines)} transitions written to the console")
+        return {'FINISHED'}
+
+
+class OT_Clicker_ExportStats(Operator, ExportHelper):
+    bl_idname = "wm.clicker_export_stats"
+    bl_label = "Export Timings"
+    bl_description = "Write the collected timings to a JSON file"
+    bl_options = {'INTERNAL'}
+
+    filename_ext = ".json"
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    def execute(self, context):
+        try:
+            stats.export_json(self.filepath)
+        except OSError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        log.info("Timings exported to %s", self.filepath)
+        return {'FINISHED'}
+
+
+class OT_Clicker_ResetStats(Operator):
+    bl_idname = "wm.clicker_reset_stats"
+    bl_label = "Reset Timings"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        stats.reset()
+        return {'FINISHED'}
+
+
+class OT_Clicker_RecordStart(Operator):
+    bl_idname = "wm.clicker_record_start"
+    bl_label = "Record Events"
+    bl_description = "Capture the events reaching the gesture operator until stopped"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        recorder.start()
+        log.info("Event recording started")
+        return {'FINISHED'}
+
+
+class OT_Clicker_RecordStop(Operator, ExportHelper):
+    bl_idname = "wm.clicker_record_stop"
+    bl_label = "Stop and Save Recording"
+    bl_description = "Stop capturing events and write the recording to a file"
+    bl_options = {'INTERNAL'}
+
+    filename_ext = recorder.FILE_EXTENSION
+    filter_glob: StringProperty(default="*" + recorder.FILE_EXTENSION, options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return recorder.active is not None
+
+    def execute(self, context):
+        recording = recorder.active
+        try:
+            recording.save(self.filepath)
+        except OSError as e:
+            # keep recording, the events are saved with the next attempt
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        recorder.stop()
+        log.info("%d events saved to %s", len(recording), self.filepath)
+        self.report({'INFO'}, f"{len(recording)} events saved")
+        return {'FINISHED'}
+
+
+class OT_Clicker_Replay(Operator, ImportHelper):
+    bl_idname = "wm.clicker_replay"
+    bl_label = "Replay Recording"
+    bl_description = "Feed a recording through the gesture recognizer and report the recognized gestures"
+    bl_options = {'INTERNAL'}
+
+    filename_ext = recorder.FILE_EXTENSION
+    filter_glob: StringProperty(default="*" + recorder.FILE_EXTENSION, options={'HIDDEN'})
+
+    click_detection_time: FloatProperty(name="Click Timeout", min=0.1, soft_max=5)
+    drag_detection_px: IntProperty(name="Drag Detection", min=0, soft_max=50)
+
+    def invoke(self, context, event):
+        prefs = ClickerPreferences.get_instance(context)
+        self.click_detection_time = prefs.click_detection_time
+        self.drag_detection_px = prefs.drag_detection_px
+        return ImportHelper.invoke(self, context, event)
+
+    def execute(self, context):
+        try:
+            recording = recorder.EventRecording.load(self.filepath)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        counts = recorder.replay(recording, self)
+        summary = ", ".join(f"{action}: {count}" for action, count in sorted(counts.items())) or "no gestures"
+        log.info("Replayed %d events: %s", len(recording), summary)
+        self.report({'INFO'}, f"{len(recording)} events, {summary}")
+        return {'FINISHED'}
+
+
+class OT_Clicker_ProfileStart(Operator):
+    bl_idname = "wm.clicker_profile_start"
+    bl_label = "Profile Next Switches"
+    bl_description = "Run the next mode switches under cProfile and write a .pstats file and a summary for each"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        prefs = ClickerPreferences.get_instance(context)
+        directory = bpy.path.abspath(prefs.profile_directory) if prefs.profile_directory else \
+            os.path.join(tempfile.gettempdir(), 'mmb_clicker_profiles')
+        phases = {'execute': prefs.profile_count}
+        if prefs.profile_invoke:
+            phases['invoke'] = prefs.profile_count
+        profiler.start(phases, directory)
+        log.info("Profiling %s, writing to %s", phases, directory)
+        self.report({'INFO'}, f"Profiles will be written to {directory}")
+        return {'FINISHED'}
+
+
+class OT_Clicker_ProfileCancel(Operator):
+    bl_idname = "wm.clicker_profile_cancel"
+    bl_label = "Stop Profiling"
+    bl_options = {'INTERNAL'}
+
+    @classmethod
+    def poll(cls, context):
+        return profiler.armed
+
+    def execute(self, context):
+        profiler.cancel()
+        log.info("Profiling stopped, %d profiles written", len(profiler.written))
+        return {'FINISHED'}
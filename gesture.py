@@ -0,0 +1,201 @@
+'''
+Middle mouse button gesture recognizer.
+
+Pure Python, no bpy import: events are duck typed objects providing type, value,
+mouse_x, mouse_y, shift, ctrl, alt and oskey, so the engine can also be driven by
+synthetic or recorded events.
+'''
+from enum import Enum
+
+
+class Keystate(Enum):
+    IDLE = 1
+    DOWN1 = 2
+    UP1 = 3
+    DOWN2 = 4
+
+
+# operator results
+PASS_THROUGH = 'PASS_THROUGH'
+RUNNING_MODAL = 'RUNNING_MODAL'
+
+# actions the caller has to perform after feeding an event
+ROTATE = 'ROTATE'   # hand over to view3d.rotate
+MOVE = 'MOVE'       # hand over to view3d.move
+SWITCH = 'SWITCH'   # double click recognized, run the mode switcher
+
+EVENT_VALUES = ('ANY', 'PRESS', 'RELEASE', 'CLICK', 'DOUBLE_CLICK', 'CLICK_DRAG', 'NOTHING')
+
+_PASS = (PASS_THROUGH, None)
+_MODAL = (RUNNING_MODAL, None)
+
+
+def _has_modifier(event) -> bool:
+    return event.shift or event.ctrl or event.alt or event.oskey
+
+
+class GestureEngine:
+    ''' State machine turning raw MIDDLEMOUSE/MOUSEMOVE events into gestures '''
+    __slots__ = ('settings', 'state', 'last_click', 'last_x', 'last_y', 'first_press', 'jitter')
+
+    def __init__(self, settings):
+        # settings provides click_detection_time and drag_detection_px
+        self.settings = settings
+        self.reset()
+
+    def reset(self):
+        self.state = Keystate.IDLE
+        self.last_click = 0.0
+        self.last_x = 0
+        self.last_y = 0
+        # time of the press starting the gesture and the largest mouse offset from it since
+        self.first_press = 0.0
+        self.jitter = 0
+
+    def time_exceeded(self, now: float) -> bool:
+        return (now - self.last_click) > self.settings.click_detection_time
+
+    def deadline(self):
+        ''' time at which the current gesture expires without further events, None if it can't '''
+        if self.state is Keystate.DOWN1 or self.state is Keystate.UP1:
+            return self.last_click + self.settings.click_detection_time
+        return None
+
+    def expire(self, now: float):
+        '''
+        Apply the click detection timeout without an event, called when the deadline passed.
+        A held first press hands over to rotate, a pending second click is dropped.
+        Returns the action or None.
+        '''
+        state = self.state
+        if state is Keystate.DOWN1 or state is Keystate.UP1:
+            if self.time_exceeded(now):
+                self.state = Keystate.IDLE
+                if state is Keystate.DOWN1:
+                    return ROTATE
+        return None
+
+    def track_jitter(self, event):
+        ''' the learned drag detection has to allow the largest offset of the whole gesture '''
+        offset = max(abs(event.mouse_x - self.last_x), abs(event.mouse_y - self.last_y))
+        if offset > self.jitter:
+            self.jitter = offset
+
+    def double_click_timing(self, now: float) -> tuple:
+        ''' (seconds, pixels) the double click just recognized at now needed '''
+        return max(self.last_click - self.first_press, now - self.last_click), self.jitter
+
+    def move_distance_exceeded(self, event) -> bool:
+        pixels = self.settings.drag_detection_px
+        return abs(event.mouse_x - self.last_x) > pixels or abs(event.mouse_y - self.last_y) > pixels
+
+    def feed(self, event, now: float) -> tuple:
+        ''' returns (operator result, action or None) '''
+        state = self.state
+        event_type = event.type
+
+        # nearly all events arrive while idle, only a middle mouse press matters there
+        if state is Keystate.IDLE and event_type != 'MIDDLEMOUSE':
+            return _PASS
+
+        handler = _transitions.get((state, event_type, event.value))
+        if handler is None:
+            handler = _fallbacks.get(state)
+            if handler is None:
+                return _PASS
+        return handler(self, event, now)
+
+    # transition handlers
+
+    def _idle_press(self, event, now):
+        self.last_click = now
+        self.first_press = now
+        self.jitter = 0
+        self.last_x = event.mouse_x
+        self.last_y = event.mouse_y
+        self.state = Keystate.DOWN1
+        # swallow the keydown
+        return _MODAL
+
+    def _down1_release(self, event, now):
+        self.track_jitter(event)
+        if self.time_exceeded(now) or self.move_distance_exceeded(event):
+            self.state = Keystate.IDLE
+        else:
+            self.state = Keystate.UP1
+            self.last_click = now
+        return _PASS
+
+    def _down1_move(self, event, now):
+        self.track_jitter(event)
+        if self.time_exceeded(now) or self.move_distance_exceeded(event):
+            # mouse/time moved too much, handing over to rotate
+            self.state = Keystate.IDLE
+            return PASS_THROUGH, ROTATE
+        return _PASS
+
+    def _up1_other(self, event, now):
+        self.track_jitter(event)
+        if self.time_exceeded(now) or self.move_distance_exceeded(event):
+            # mouse/time moved too much, resetting
+            self.state = Keystate.IDLE
+        return _PASS
+
+    def _up1_press(self, event, now):
+        self.track_jitter(event)
+        if self.time_exceeded(now) or self.move_distance_exceeded(event) or _has_modifier(event):
+            self.state = Keystate.IDLE
+            return _PASS
+        self.state = Keystate.DOWN2
+        return _MODAL
+
+    def _down2_release(self, event, now):
+        self.track_jitter(event)
+        self.state = Keystate.IDLE
+        if _has_modifier(event) or self.time_exceeded(now):
+            return _PASS
+        if self.move_distance_exceeded(event):
+            return PASS_THROUGH, ROTATE
+        return PASS_THROUGH, SWITCH
+
+    def _down2_move(self, event, now):
+        self.track_jitter(event)
+        if self.move_distance_exceeded(event):
+            self.state = Keystate.IDLE
+            return PASS_THROUGH, MOVE
+        return _MODAL
+
+    def _down2_deactivate(self, event, now):
+        self.state = Keystate.IDLE
+        return _PASS
+
+    def _down2_other(self, event, now):
+        return _MODAL
+
+
+def _build_transitions() -> dict:
+    table = {}
+
+    def on(state, event_type, handler, values=EVENT_VALUES):
+        for value in values:
+            table[(state, event_type, value)] = handler
+
+    E = GestureEngine
+    on(Keystate.IDLE, 'MIDDLEMOUSE', E._idle_press, ('PRESS',))
+    on(Keystate.DOWN1, 'MIDDLEMOUSE', E._down1_release, ('RELEASE',))
+    on(Keystate.DOWN1, 'MOUSEMOVE', E._down1_move)
+    on(Keystate.UP1, 'MIDDLEMOUSE', E._up1_press, ('PRESS',))
+    on(Keystate.DOWN2, 'MIDDLEMOUSE', E._down2_release, ('RELEASE',))
+    on(Keystate.DOWN2, 'MOUSEMOVE', E._down2_move)
+    on(Keystate.DOWN2, 'WINDOW_DEACTIVATE', E._down2_deactivate)
+    return table
+
+
+# (state, event type, event value) -> handler
+_transitions = _build_transitions()
+
+# handler for events without an entry in the table, per state
+_fallbacks = {
+    Keystate.UP1: GestureEngine._up1_other,
+    Keystate.DOWN2: GestureEngine._down2_other,
+}
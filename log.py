@@ -1,50 +1,175 @@
 import logging
+import logging.handlers
+import queue
+import time
+from collections import deque
+
+import bpy
+
 from .uisettings import ClickerPreferences
 
-logger: logging.Logger
-logger_name: str
+# replaced by init_logger, until then (and in background mode) warnings go to Python's last resort handler
+logger_name = __name__
+logger = logging.getLogger(logger_name)
+
+# Records are handed to a background thread, console and file I/O never block the UI.
+listener: logging.handlers.QueueListener = None
+log_queue: queue.SimpleQueue = None
+
+# optional rotating log file, set by the preferences
+file_path = ''
+file_max_kb = 1024
+FILE_BACKUPS = 3
+
+FORMAT = '%(levelname)8s|%(filename)14s|%(name)s|%(funcName)22s()|%(message)s'
 
+# Checked by callers on hot paths before even building the message arguments.
+debug_enabled = False
+info_enabled = False
 
-def debug(msg: str):
-    logger.debug(msg, stacklevel=2)
+# Messages are %-style and only formatted if the level is enabled.
 
-def info(msg: str):
-    logger.info(msg, stacklevel=2)
+def debug(msg: str, *args):
+    if debug_enabled:
+        logger.debug(msg, *args, stacklevel=2)
 
-def warning(msg: str):
-    logger.warning(msg, stacklevel=2)
+def info(msg: str, *args):
+    if info_enabled:
+        logger.info(msg, *args, stacklevel=2)
+
+def warning(msg: str, *args):
+    logger.warning(msg, *args, stacklevel=2)
     
-def error(msg: str):
-    logger.error(msg, stacklevel=2)
+def error(msg: str, *args):
+    logger.error(msg, *args, stacklevel=2)
+
+
+'''Trace ring buffer, keeps the last transitions in memory until dumped'''
+
+TRACE_SIZE = 256
+trace_buffer = deque(maxlen=TRACE_SIZE)
+
+
+def trace(msg: str, *args):
+    trace_buffer.append((time.time(), msg, args))
+
+
+def format_trace() -> list:
+    lines = []
+    for timestamp, msg, args in trace_buffer:
+        stamp = time.strftime('%H:%M:%S', time.localtime(timestamp))
+        lines.append(f"{stamp}.{int(timestamp * 1000) % 1000:03d} {msg % args}")
+    return lines
+
+
+def clear_trace():
+    trace_buffer.clear()
+
+
+def update_level_flags():
+    global debug_enabled
+    global info_enabled
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    info_enabled = logger.isEnabledFor(logging.INFO)
+
+
+def create_handlers() -> list:
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.StreamHandler()]
+    if file_path:
+        path = bpy.path.abspath(file_path)
+        try:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                path, maxBytes=file_max_kb * 1024, backupCount=FILE_BACKUPS, encoding='utf-8', delay=True))
+        except OSError as e:
+            logger.error("Cannot open log file %s: %s", path, e)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def start_listener():
+    global listener
+    stop_listener()
+    listener = logging.handlers.QueueListener(log_queue, *create_handlers())
+    listener.start()
+
+
+def stop_listener():
+    ''' waits until the queued records are written '''
+    global listener
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    listener = None
+
+
+def remove_handlers():
+    ''' remove the handlers of an earlier load, e.g. after a reload without unregister '''
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        stop = getattr(handler, 'stop_listener', None)
+        if stop is not None:
+            stop()
+        handler.close()
 
 
 def init_logger(name: str):
     global logger_name
     global logger
+    global log_queue
     logger_name = name
     logger = logging.getLogger(name)
     logger.setLevel('DEBUG')
+    remove_handlers()
 
-    streamhandler = logging.StreamHandler()
-
-    formatter = logging.Formatter(
-        '%(levelname)8s|%(filename)14s|%(name)s|%(funcName)22s()|%(message)s')
-
-    streamhandler.setFormatter(formatter)
-
-    logger.addHandler(streamhandler)
+    log_queue = queue.SimpleQueue()
+    start_listener()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # lets a later load stop this listener, the module globals are gone by then
+    queue_handler.stop_listener = stop_listener
+    logger.addHandler(queue_handler)
+    update_level_flags()
 
 def debug_level_cb(new_level: str):
     logger.setLevel(new_level)
+    update_level_flags()
     logger.info('Log level set to ' + new_level)
-    
+
+
+def log_file_path_cb(value: str):
+    global file_path
+    if value != file_path:
+        file_path = value
+        start_listener()
+
+
+def log_file_max_kb_cb(value: int):
+    global file_max_kb
+    if value != file_max_kb:
+        file_max_kb = value
+        if file_path:
+            start_listener()
+
+
 def setup_preferences_cb():
     ClickerPreferences.register_callback('debug_level', debug_level_cb)
+    ClickerPreferences.register_callback('log_file_max_kb', log_file_max_kb_cb)
+    ClickerPreferences.register_callback('log_file_path', log_file_path_cb)
     logger.debug('logger was set up ' + __package__)
-    pass
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('debug_level', debug_level_cb)
+    ClickerPreferences.unregister_callback('log_file_max_kb', log_file_max_kb_cb)
+    ClickerPreferences.unregister_callback('log_file_path', log_file_path_cb)
 
 
 def uninit_logger():
     logger.debug('removing the logger ' + logger_name)
+    remove_handlers()
     if logger_name in logging.Logger.manager.loggerDict:
         del logging.Logger.manager.loggerDict[logger_name]
+    clear_trace()
@@ -1,144 +1,425 @@
 import bpy
 import time
-from enum import Enum
 from bpy.types import Operator
 
-from . import log
+from . import log, gesture, picking, profiler, recorder, stats
+from .adaptive import AdaptiveTiming
+from .gesture import GestureEngine, Keystate
 from .uisettings import ClickerPreferences
 
 IDNAME = 'wm.clicker_controlling'
 
+# MOUSEMOVE keymap item, only active while a gesture is in progress
+move_item = None
+
+# (keymap, item) pairs added by keymap_initialize
+keymap_items = []
+
+
+def remove_stale_items(keymap):
+    ''' items of an earlier load that wasn't unregistered '''
+    for item in [item for item in keymap.keymap_items if item.idname == IDNAME]:
+        keymap.keymap_items.remove(item)
 
-def keymap_initialize():
-    keymap_remove()  # clean up possible crashed remains
 
+def keymap_initialize():
+    global move_item
     keyconfigs_addon = bpy.context.window_manager.keyconfigs.addon
     if keyconfigs_addon:
         keymap_view3d = keyconfigs_addon.keymaps.new(
             name="3D View", space_type='VIEW_3D')
-        _ = keymap_view3d.keymap_items.new(IDNAME, 'MOUSEMOVE', 'ANY')
-        _ = keymap_view3d.keymap_items.new(IDNAME, 'MIDDLEMOUSE', 'ANY')
-        _ = keymap_view3d.keymap_items.new(IDNAME, 'WINDOW_DEACTIVATE', 'ANY')
+        remove_stale_items(keymap_view3d)
+        move_item = keymap_view3d.keymap_items.new(IDNAME, 'MOUSEMOVE', 'ANY')
+        move_item.active = False
+        keymap_items.append((keymap_view3d, move_item))
+        for event_type in ('MIDDLEMOUSE', 'WINDOW_DEACTIVATE'):
+            keymap_items.append((keymap_view3d, keymap_view3d.keymap_items.new(IDNAME, event_type, 'ANY')))
     else:
         log.error("Cannot add keymap items!")
 
 
 def keymap_remove():
+    global move_item
+    move_item = None
+    cancel_deadline()
+    cancel_speculations()
+    cancel_pending_switches()
+    engines.clear()
+    busy_windows.clear()
+    for keymap, item in keymap_items:
+        try:
+            keymap.keymap_items.remove(item)
+        except (ReferenceError, RuntimeError):
+            pass  # keymaps were rebuilt meanwhile
+    keymap_items.clear()
+
+
+def find_move_item():
     keyconfigs_addon = bpy.context.window_manager.keyconfigs.addon
     if keyconfigs_addon:
         for map in keyconfigs_addon.keymaps:
             if map.name == "3D View":
                 for item in map.keymap_items:
-                    if item.idname == IDNAME:
-                        map.keymap_items.remove(item)
-                break
-
-class Keystate(Enum):
-    IDLE = 1
-    DOWN1 = 2
-    UP1 = 3
-    DOWN2 = 4
-    
-
-# Globals, because members in this special Operator class aren't kept.
-key_state = Keystate.IDLE
-last_click = 0
-last_x = last_y = 0
+                    if item.idname == IDNAME and item.type == 'MOUSEMOVE':
+                        return item
+    log.warning("MOUSEMOVE keymap item not found")
+
+
+def set_move_tracking(enabled: bool):
+    ''' mouse moves only reach the operator while a gesture needs them '''
+    global move_item
+    if move_item is None:
+        return
+    try:
+        if move_item.active != enabled:
+            move_item.active = enabled
+    except ReferenceError:
+        # keymaps were rebuilt meanwhile, look the item up again
+        move_item = find_move_item()
+        if move_item is not None:
+            move_item.active = enabled
+
+
+class PreferencesSnapshot:
+    ''' Copy of the settings needed per event, kept current by preference callbacks '''
+    click_detection_time = 0.5
+    drag_detection_px = 10
+
+
+settings = PreferencesSnapshot()
+
+# learns from the recognized double clicks, gives the values for the snapshot
+timing = AdaptiveTiming()
+
+
+def update_settings():
+    time, px = timing.effective()
+    if time != settings.click_detection_time or px != settings.drag_detection_px:
+        settings.click_detection_time = time
+        settings.drag_detection_px = px
+        log.info("Click detection %.3fs, drag detection %dpx", time, px)
+
+
+def click_detection_time_cb(value: float):
+    timing.click_detection_time = value
+    update_settings()
+
+
+def drag_detection_px_cb(value: int):
+    timing.drag_detection_px = value
+    update_settings()
+
+
+def adaptive_timing_cb(value: bool):
+    timing.enabled = value
+    update_settings()
+
+
+def adaptive_percentile_cb(value: float):
+    timing.percentile = value
+    update_settings()
+
+
+def setup_preferences_cb():
+    ClickerPreferences.register_callback('click_detection_time', click_detection_time_cb)
+    ClickerPreferences.register_callback('drag_detection_px', drag_detection_px_cb)
+    ClickerPreferences.register_callback('adaptive_timing', adaptive_timing_cb)
+    ClickerPreferences.register_callback('adaptive_percentile', adaptive_percentile_cb)
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('click_detection_time', click_detection_time_cb)
+    ClickerPreferences.unregister_callback('drag_detection_px', drag_detection_px_cb)
+    ClickerPreferences.unregister_callback('adaptive_timing', adaptive_timing_cb)
+    ClickerPreferences.unregister_callback('adaptive_percentile', adaptive_percentile_cb)
+
+
+# Global, because members in this special Operator class aren't kept.
+# window pointer -> GestureEngine, every window tracks its own gesture
+engines = {}
+
+# pointers of the windows with a gesture in progress
+busy_windows = set()
+
+# window pointer -> (window, area, region) of the running gesture, for handing over from the deadline timer
+gesture_contexts = {}
+
+
+def engine_for(pointer: int) -> GestureEngine:
+    engine = engines.get(pointer)
+    if engine is None:
+        prune_engines()
+        engine = engines[pointer] = GestureEngine(settings)
+    return engine
+
+
+def prune_engines():
+    ''' drop the state of closed windows '''
+    open_windows = {window.as_pointer() for window in bpy.context.window_manager.windows}
+    for pointer in [pointer for pointer in engines if pointer not in open_windows]:
+        del engines[pointer]
+        busy_windows.discard(pointer)
+        picking.discard(pointer)
+        speculation_requests.pop(pointer, None)
+        gesture_contexts.pop(pointer, None)
+        pending_switches.pop(pointer, None)
+    set_move_tracking(bool(busy_windows))
+
+
+def set_window_busy(pointer: int, busy: bool):
+    if busy:
+        busy_windows.add(pointer)
+    else:
+        busy_windows.discard(pointer)
+    set_move_tracking(bool(busy_windows))
+
+
+def deadline_expired():
+    ''' bpy.app.timers callback, applies the click detection timeout without waiting for an event '''
+    now = time.monotonic()
+    next_deadline = None
+    for pointer in list(gesture_contexts):
+        engine = engines.get(pointer)
+        deadline = engine.deadline() if engine is not None else None
+        if deadline is None:
+            del gesture_contexts[pointer]
+            continue
+        if now < deadline:
+            # the gesture was continued meanwhile, wait for the new deadline
+            if next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+            continue
+
+        key_state_prev = engine.state
+        action = engine.expire(now)
+        log.trace('%s << deadline -> %s', key_state_prev, engine.state)
+        set_window_busy(pointer, False)
+        picking.discard(pointer)
+
+        window, area, region = gesture_contexts.pop(pointer)
+        if action is gesture.ROTATE:
+            log.info("%s: held too long, handing over to rotate.", key_state_prev)
+            try:
+                with bpy.context.temp_override(window=window, area=area, region=region):
+                    bpy.ops.view3d.rotate('INVOKE_DEFAULT')
+            except (ReferenceError, RuntimeError) as e:
+                # the window or area was closed or changed meanwhile
+                log.warning("Cannot hand over to rotate: %s", e)
+        else:
+            log.info("%s: time ran out, resetting.", key_state_prev)
+
+    return None if next_deadline is None else next_deadline - now
+
+
+def schedule_deadline(context: bpy.types.Context, pointer: int, deadline: float, now: float):
+    gesture_contexts[pointer] = (context.window, context.area, context.region)
+    # deadlines only move later, a registered timer re-arms itself
+    if not bpy.app.timers.is_registered(deadline_expired):
+        bpy.app.timers.register(deadline_expired, first_interval=max(0.0, deadline - now))
+
+
+def cancel_deadline():
+    gesture_contexts.clear()
+    if bpy.app.timers.is_registered(deadline_expired):
+        bpy.app.timers.unregister(deadline_expired)
+
+
+'''Speculative pick, runs from a timer in the pause between the clicks of a double click'''
+
+# delay after the first release, a pan gesture has usually pressed again by then
+SPECULATION_DELAY = 0.02
+
+# window pointer -> (window, area, region, mouse_x, mouse_y) of the first release
+speculation_requests = {}
+
+
+def queue_speculation(context: bpy.types.Context, window_pointer: int, mouse_x: int, mouse_y: int):
+    speculation_requests[window_pointer] = (context.window, context.area, context.region, mouse_x, mouse_y)
+    if not bpy.app.timers.is_registered(run_speculations):
+        bpy.app.timers.register(run_speculations, first_interval=SPECULATION_DELAY)
+
+
+def run_speculations():
+    ''' bpy.app.timers callback '''
+    while speculation_requests:
+        pointer, (window, area, region, mouse_x, mouse_y) = speculation_requests.popitem()
+        engine = engines.get(pointer)
+        if engine is None or engine.state is not Keystate.UP1:
+            # pressed again meanwhile, a switch picks by itself, a pan isn't held up
+            continue
+        try:
+            with bpy.context.temp_override(window=window, area=area, region=region):
+                picking.speculate(bpy.context, pointer, area, mouse_x, mouse_y, settings.drag_detection_px)
+        except (ReferenceError, RuntimeError) as e:
+            # the window or area was closed or changed meanwhile
+            log.warning("Cannot pick ahead: %s", e)
+    return None
+
+
+def cancel_speculations():
+    speculation_requests.clear()
+    if bpy.app.timers.is_registered(run_speculations):
+        bpy.app.timers.unregister(run_speculations)
+
+
+'''Deferred mode switch, runs from a timer so the event handler returns right away'''
+
+# delay before a queued switch runs, lets the status bar and cursor redraw first
+SWITCH_DELAY = 0.01
+
+
+class PendingSwitch:
+    __slots__ = ('window', 'area', 'region', 'mouse_x', 'mouse_y')
+
+    def __init__(self, context: bpy.types.Context, mouse_x: int, mouse_y: int):
+        self.window = context.window
+        self.area = context.area
+        self.region = context.region
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+
+
+# window pointer -> PendingSwitch, a newer request of a window replaces the older one
+pending_switches = {}
+
+
+def queue_switch(context: bpy.types.Context, window_pointer: int, mouse_x: int, mouse_y: int):
+    if window_pointer in pending_switches:
+        log.info("Replacing the pending switch")
+    else:
+        context.workspace.status_text_set("Switching mode...")
+        context.window.cursor_modal_set('WAIT')
+    pending_switches[window_pointer] = PendingSwitch(context, mouse_x, mouse_y)
+    if not bpy.app.timers.is_registered(run_pending_switches):
+        bpy.app.timers.register(run_pending_switches, first_interval=SWITCH_DELAY)
+
+
+def end_feedback(switch: PendingSwitch):
+    try:
+        switch.window.workspace.status_text_set(None)
+        switch.window.cursor_modal_restore()
+    except ReferenceError:
+        pass  # window closed meanwhile
+
+
+def cancel_switch(window_pointer: int):
+    switch = pending_switches.pop(window_pointer, None)
+    if switch is not None:
+        log.info("Pending switch cancelled by a new gesture")
+        end_feedback(switch)
+
+
+# switchop module, imported and registered on the first double click
+switcher = None
+
+
+def load_switcher():
+    global switcher
+    if switcher is None:
+        start = time.perf_counter()
+        from . import switchop
+        switchop.register()
+        switcher = switchop
+        log.info("Mode switcher loaded in %.1f ms", (time.perf_counter() - start) * 1000.0)
+    return switcher
+
+
+def unload_switcher():
+    global switcher
+    if switcher is not None:
+        switcher.unregister()
+        switcher = None
+
+
+def run_pending_switches():
+    ''' bpy.app.timers callback '''
+    load_switcher()
+    while pending_switches:
+        _, switch = pending_switches.popitem()
+        try:
+            with bpy.context.temp_override(window=switch.window, area=switch.area, region=switch.region):
+                bpy.ops.view3d.clicker_mode_switcher(mouse_x=switch.mouse_x, mouse_y=switch.mouse_y)
+        except (ReferenceError, RuntimeError) as e:
+            # the window or area was closed or changed meanwhile
+            log.warning("Cannot switch: %s", e)
+        finally:
+            end_feedback(switch)
+    return None
+
+
+def cancel_pending_switches():
+    for window_pointer in list(pending_switches):
+        cancel_switch(window_pointer)
+    if bpy.app.timers.is_registered(run_pending_switches):
+        bpy.app.timers.unregister(run_pending_switches)
+
 
 class EVENTKEYMAP_OT_Clicker_Addon(Operator):
     bl_idname = IDNAME
     bl_label = "Clicker Mode Control"
 
     def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        if profiler.armed:
+            with profiler.profiled('invoke'):
+                return self.handle_event(context, event)
+        return self.handle_event(context, event)
+
+    def handle_event(self, context: bpy.types.Context, event: bpy.types.Event):
         if context is None or event is None or context.region is None:
             return {'PASS_THROUGH'}
-        
-        global key_state
-        global last_x, last_y, last_click
-        
-        current = time.time()
+
+        start = time.perf_counter() if stats.enabled else 0.0
+
+        window_pointer = context.window.as_pointer()
+        engine = engine_for(window_pointer)
 
         # logging purpose
-        key_state_prev = key_state
-
-        click_time = ClickerPreferences.get_instance(
-            context).click_detection_time
-        pixels = ClickerPreferences.get_instance(context).drag_detection_px
-
-        move_distance_exceeded = abs(
-            event.mouse_x - last_x) > pixels or abs(event.mouse_y - last_y) > pixels
-        time_exceeded = (current - last_click) > click_time
-
-        if key_state == Keystate.IDLE:
-            if event.type == 'MIDDLEMOUSE' and event.value == 'PRESS':
-                last_click = current
-                key_state = Keystate.DOWN1
-
-                last_x = event.mouse_x
-                last_y = event.mouse_y
-
-                # swallow the keydown
-                log.info(str(key_state_prev) + " << " + event.type +
-                          "/" + event.value + " -> " + str(key_state))
-                return {'RUNNING_MODAL'}
-
-        elif key_state == Keystate.DOWN1:
-            if event.type == 'MIDDLEMOUSE' and event.value == 'RELEASE':
-                if time_exceeded or move_distance_exceeded:
-                    key_state = Keystate.IDLE
-                else:
-                    key_state = Keystate.UP1
-                    last_click = current
-
-            elif event.type == 'MOUSEMOVE':
-                if time_exceeded or move_distance_exceeded:
-                    log.info(
-                        "DOWN1: mouse/time moved too much, handing over to rotate.")
-                    bpy.ops.view3d.rotate('INVOKE_DEFAULT')
-                    key_state = Keystate.IDLE
-
-        elif key_state == Keystate.UP1:
-            if time_exceeded or move_distance_exceeded:
-                log.info("UP1: mouse/time moved too much, resetting.")
-                key_state = Keystate.IDLE
-            elif event.type == 'MIDDLEMOUSE' and event.value == 'PRESS':
-                if event.shift or event.ctrl or event.alt or event.oskey:  # Ignore
-                    key_state = Keystate.IDLE
-                elif not time_exceeded:
-                    key_state = Keystate.DOWN2
-                else:
-                    bpy.ops.view3d.rotate('INVOKE_DEFAULT')
-                    key_state = Keystate.IDLE
-
-        elif key_state == Keystate.DOWN2:
-            if event.type == 'MIDDLEMOUSE' and event.value == 'RELEASE':
-                if event.shift or event.ctrl or event.alt or event.oskey:  # Ignore
-                    key_state = Keystate.IDLE
-                elif not time_exceeded:
-                    if move_distance_exceeded:
-                        log.info(
-                            "mouse moved too much, handing over to rotate.")
-                        bpy.ops.view3d.rotate('INVOKE_DEFAULT')
-                        key_state = Keystate.IDLE
-                    else:
-                        key_state = Keystate.IDLE
-                        if bpy.ops.view3d.clicker_mode_switcher:
-                            bpy.ops.view3d.clicker_mode_switcher(
-                                mouse_x=event.mouse_x, mouse_y=event.mouse_y)
-                else:
-                    key_state = Keystate.IDLE
-            elif event.type == 'MOUSEMOVE':
-                if move_distance_exceeded:
-                    log.info('BeginDrag')
-                    bpy.ops.view3d.move('INVOKE_DEFAULT')
-                    key_state = Keystate.IDLE
-
-            elif event.type == 'WINDOW_DEACTIVATE':
-                key_state = Keystate.IDLE
-
-        log.debug(str(key_state_prev) + " << " + event.type + "/" + event.value + " -> " + str(key_state))
-        
-        if key_state == Keystate.DOWN2:
-            return {'RUNNING_MODAL'}
-
-        return {'PASS_THROUGH'}
+        key_state_prev = engine.state
+
+        now = time.monotonic()
+        if recorder.active is not None:
+            recorder.active.append(event, now)
+
+        result, action = engine.feed(event, now)
+        key_state = engine.state
+
+        if key_state is not key_state_prev:
+            log.trace('%s << %s/%s -> %s', key_state_prev, event.type, event.value, key_state)
+            if key_state is Keystate.IDLE or key_state_prev is Keystate.IDLE:
+                set_window_busy(window_pointer, key_state is not Keystate.IDLE)
+                if key_state_prev is Keystate.IDLE and pending_switches:
+                    cancel_switch(window_pointer)
+            if key_state is Keystate.DOWN1 or key_state is Keystate.UP1:
+                schedule_deadline(context, window_pointer, engine.deadline(), now)
+
+            if key_state is Keystate.UP1:
+                # a double click may follow, pick the object under the cursor in the pause.
+                # The switcher only uses it if the release happens near the same position.
+                queue_speculation(context, window_pointer, event.mouse_x, event.mouse_y)
+            elif key_state is Keystate.IDLE and action is not gesture.SWITCH:
+                # rotate, move or reset
+                speculation_requests.pop(window_pointer, None)
+                picking.discard(window_pointer)
+
+        if start:
+            # per event overhead, the handed over operators are not included
+            stats.record('invoke', time.perf_counter() - start)
+
+        if action is gesture.ROTATE:
+            log.info("%s: mouse/time moved too much, handing over to rotate.", key_state_prev)
+            bpy.ops.view3d.rotate('INVOKE_DEFAULT')
+        elif action is gesture.MOVE:
+            log.info('BeginDrag')
+            bpy.ops.view3d.move('INVOKE_DEFAULT')
+        elif action is gesture.SWITCH:
+            if timing.enabled:
+                timing.observe(*engine.double_click_timing(now))
+                update_settings()
+            queue_switch(context, window_pointer, event.mouse_x, event.mouse_y)
+        elif key_state_prev is Keystate.UP1 and key_state is Keystate.IDLE:
+            log.info("UP1: mouse/time moved too much, resetting.")
+
+        if log.debug_enabled:
+            log.debug('%s << %s/%s -> %s', key_state_prev, event.type, event.value, key_state)
+
+        return {result}
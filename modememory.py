@@ -0,0 +1,154 @@
+'''
+Last used interaction mode per object, with the mode per object type as fallback.
+
+Kept in memory and only written to the workspace ID properties when the file is
+saved or the workspace is changed, so a switch doesn't touch ID properties.
+'''
+from collections import OrderedDict
+
+import bpy
+from bpy.app.handlers import persistent
+
+from . import log
+from .uisettings import ClickerPreferences
+
+# workspace ID properties, object type -> mode and object name -> mode
+TYPE_MODES_PROP = 'clicker_last_modes'
+OBJECT_MODES_PROP = 'clicker_object_modes'
+
+# (workspace name, object name) -> mode, least recently used first
+object_modes = OrderedDict()
+# (workspace name, object type) -> mode
+type_modes = {}
+# names of the workspaces whose properties were read, and of those changed since
+loaded = set()
+dirty = set()
+
+history_size = 1000
+
+# msgbus owner of the workspace subscription
+_owner = object()
+
+
+def load_workspace(ws):
+    ''' read the stored modes of a workspace, once '''
+    loaded.add(ws.name)
+    stored = ws.get(TYPE_MODES_PROP)
+    if stored:
+        for obj_type, mode in stored.items():
+            type_modes.setdefault((ws.name, obj_type), mode)
+    stored = ws.get(OBJECT_MODES_PROP)
+    if stored:
+        for name, mode in stored.items():
+            object_modes.setdefault((ws.name, name), mode)
+        trim()
+
+
+def last_mode(ws, obj):
+    ''' last mode of obj in this workspace, else the last mode of its type, None if neither is known '''
+    if ws.name not in loaded:
+        load_workspace(ws)
+    key = (ws.name, obj.name)
+    mode = object_modes.get(key)
+    if mode is not None:
+        object_modes.move_to_end(key)
+        return mode
+    return type_modes.get((ws.name, obj.type))
+
+
+def remember(ws, obj, mode: str):
+    if ws.name not in loaded:
+        load_workspace(ws)
+    key = (ws.name, obj.name)
+    object_modes[key] = mode
+    object_modes.move_to_end(key)
+    type_modes[(ws.name, obj.type)] = mode
+    dirty.add(ws.name)
+    trim()
+
+
+def trim():
+    while len(object_modes) > history_size:
+        object_modes.popitem(last=False)
+
+
+def write_back():
+    ''' store the modes of the changed workspaces in their ID properties '''
+    for ws_name in dirty:
+        ws = bpy.data.workspaces.get(ws_name)
+        if ws is None:
+            continue
+        ws[TYPE_MODES_PROP] = {
+            obj_type: mode for (name, obj_type), mode in type_modes.items() if name == ws_name}
+        ws[OBJECT_MODES_PROP] = {
+            obj_name: mode for (name, obj_name), mode in object_modes.items() if name == ws_name}
+    if dirty:
+        log.debug("Mode history written for %s", dirty)
+    dirty.clear()
+
+
+def clear():
+    object_modes.clear()
+    type_modes.clear()
+    loaded.clear()
+    dirty.clear()
+
+
+def workspace_changed():
+    write_back()
+
+
+def subscribe():
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.Window, 'workspace'),
+        owner=_owner,
+        args=(),
+        notify=workspace_changed)
+
+
+@persistent
+def save_pre(*args):
+    write_back()
+
+
+@persistent
+def load_post(*args):
+    # the modes belong to the previous file, file loading also drops the msgbus subscriptions
+    clear()
+    subscribe()
+
+
+def history_size_cb(value: int):
+    global history_size
+    history_size = value
+    trim()
+
+
+def setup_preferences_cb():
+    ClickerPreferences.register_callback('mode_history_size', history_size_cb)
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('mode_history_size', history_size_cb)
+
+
+_handlers = (
+    (bpy.app.handlers.save_pre, save_pre),
+    (bpy.app.handlers.load_post, load_post),
+)
+
+
+def register():
+    for handlers, handler in _handlers:
+        if handler not in handlers:
+            handlers.append(handler)
+    subscribe()
+
+
+def unregister():
+    write_back()
+    bpy.msgbus.clear_by_owner(_owner)
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+    clear()
@@ -0,0 +1,103 @@
+'''
+Per object caches for lookups done on every mode switch, keyed by object pointer.
+Entries are dropped from depsgraph update handlers when the object changes and
+cleared completely after undo and file load, which reallocate the objects.
+'''
+import bpy
+from bpy.app.handlers import persistent
+
+from . import log
+
+# object pointer -> armature object of its first armature modifier, or None
+armatures = {}
+
+# object pointer -> {vertex group name: index}
+vertex_group_indices = {}
+
+# modules using the caches, the handlers are only installed while there are any
+users = set()
+
+
+def armature_of(obj):
+    key = obj.as_pointer()
+    armature = armatures.get(key, False)
+    if armature is None:
+        return None
+    if armature is not False:
+        try:
+            armature.name  # raises if the armature was deleted meanwhile
+            return armature
+        except ReferenceError:
+            pass
+
+    armature = None
+    for mod in obj.modifiers:
+        if mod.type == 'ARMATURE':
+            armature = mod.object
+            break
+    armatures[key] = armature
+    return armature
+
+
+def vertex_group_index(obj, name: str):
+    ''' index of the vertex group with the given name or None '''
+    key = obj.as_pointer()
+    groups = obj.vertex_groups
+    indices = vertex_group_indices.get(key)
+    if indices is not None and len(indices) == len(groups):
+        index = indices.get(name)
+        # a rename or removal the handlers didn't see makes the entry stale,
+        # a miss is rebuilt as well, a group may have been renamed to the name
+        if index is not None and index < len(groups) and groups[index].name == name:
+            return index
+
+    indices = vertex_group_indices[key] = {group.name: group.index for group in groups}
+    return indices.get(name)
+
+
+def clear():
+    armatures.clear()
+    vertex_group_indices.clear()
+
+
+@persistent
+def depsgraph_update_post(scene, depsgraph):
+    if not armatures and not vertex_group_indices:
+        return
+    for update in depsgraph.updates:
+        # modifier stack and vertex group changes tag the geometry, plain transforms don't matter
+        if update.is_updated_geometry and isinstance(update.id, bpy.types.Object):
+            key = update.id.original.as_pointer()
+            armatures.pop(key, None)
+            vertex_group_indices.pop(key, None)
+
+
+@persistent
+def data_reloaded(*args):
+    clear()
+
+
+_handlers = (
+    (bpy.app.handlers.depsgraph_update_post, depsgraph_update_post),
+    (bpy.app.handlers.undo_post, data_reloaded),
+    (bpy.app.handlers.redo_post, data_reloaded),
+    (bpy.app.handlers.load_post, data_reloaded),
+)
+
+
+def register(user: str):
+    users.add(user)
+    for handlers, handler in _handlers:
+        if handler not in handlers:
+            handlers.append(handler)
+    log.debug('object cache handlers added for %s', user)
+
+
+def unregister(user: str):
+    users.discard(user)
+    if users:
+        return
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+    clear()
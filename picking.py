@@ -0,0 +1,230 @@
+import math
+
+import bpy
+from bpy.app.handlers import persistent
+from bpy_extras import view3d_utils
+from mathutils import Vector
+
+from . import log, stats
+
+# limit for the hits along one ray, also guards against getting stuck inside a surface
+MAX_HITS = 64
+# step past a hit surface before casting again
+RAY_EPSILON = 1e-4
+
+# object types drawn as overlays the ray cannot hit. Hair, grease pencil and point clouds
+# can't be hit either, they are left to the hits on the surfaces they usually sit on.
+UNHITTABLE_TYPES = {'ARMATURE', 'EMPTY', 'LIGHT', 'CAMERA', 'LATTICE', 'SPEAKER', 'LIGHT_PROBE'}
+# added around the screen bounds of those, lights and empties have next to none
+BOUNDS_MARGIN_PX = 12
+
+# view layer objects of the UNHITTABLE_TYPES, rebuilt when the view layer or its object count changes
+unhittable = []
+unhittable_key = None
+
+
+def window_region_at(area, mouse_x: int, mouse_y: int):
+    ''' the 3D view region under the mouse, there are several in quad view '''
+    for region in area.regions:
+        if region.type == 'WINDOW' and \
+                region.x <= mouse_x < region.x + region.width and \
+                region.y <= mouse_y < region.y + region.height:
+            return region
+
+
+def unhittable_objects(view_layer) -> list:
+    global unhittable, unhittable_key
+    objects = view_layer.objects
+    key = (view_layer.as_pointer(), len(objects))
+    if key != unhittable_key:
+        unhittable = [obj for obj in objects if obj.type in UNHITTABLE_TYPES]
+        unhittable_key = key
+    return unhittable
+
+
+def depth_under_cursor(obj, region, coord, origin, direction):
+    ''' view depth of the nearest bound box corner if the cursor is within the projected bounds, else None '''
+    matrix = obj.matrix_world
+    rv3d = region.data
+    min_x = min_y = depth = math.inf
+    max_x = max_y = -math.inf
+    for corner in obj.bound_box:
+        point = matrix @ Vector(corner)
+        projected = view3d_utils.location_3d_to_region_2d(region, rv3d, point)
+        if projected is None:
+            continue  # behind the view
+        min_x = min(min_x, projected.x)
+        max_x = max(max_x, projected.x)
+        min_y = min(min_y, projected.y)
+        max_y = max(max_y, projected.y)
+        depth = min(depth, (point - origin).dot(direction))
+    if min_x - BOUNDS_MARGIN_PX <= coord[0] <= max_x + BOUNDS_MARGIN_PX and \
+            min_y - BOUNDS_MARGIN_PX <= coord[1] <= max_y + BOUNDS_MARGIN_PX:
+        return depth
+    return None
+
+
+def unhittable_in_front(view_layer, region, space, coord, origin, direction, hit_depth: float) -> bool:
+    ''' True if an object the ray cannot hit may be drawn in front of the first hit '''
+    global unhittable_key
+    for _ in range(2):
+        try:
+            for obj in unhittable_objects(view_layer):
+                if obj.hide_select or not obj.visible_get(viewport=space):
+                    continue
+                depth = depth_under_cursor(obj, region, coord, origin, direction)
+                if depth is not None and depth < hit_depth:
+                    log.debug("%s may be in front of the ray hit", obj.name)
+                    return True
+            return False
+        except ReferenceError:
+            # deleted, with as many objects added meanwhile, rebuild and check again
+            unhittable_key = None
+    return True
+
+
+def objects_under_cursor(context: bpy.types.Context, area, mouse_x: int, mouse_y: int) -> list:
+    '''
+    All selectable objects under the mouse, front to back, from one walk along the view ray.
+    Only objects with evaluated geometry are hit. An empty list means the operator based
+    pick is needed: nothing was hit, instanced geometry was hit, or an armature, empty,
+    lattice... may be in front.
+    '''
+    region = window_region_at(area, mouse_x, mouse_y)
+    if region is None or region.data is None:
+        return []
+
+    coord = (mouse_x - region.x, mouse_y - region.y)
+    origin = view3d_utils.region_2d_to_origin_3d(region, region.data, coord)
+    direction = view3d_utils.region_2d_to_vector_3d(region, region.data, coord)
+
+    depsgraph = context.evaluated_depsgraph_get()
+    scene = context.scene
+    space = area.spaces.active
+    view_layer = context.view_layer
+
+    candidates = []
+    seen = set()
+    view_origin = origin
+    for _ in range(MAX_HITS):
+        hit, location, _, _, obj, matrix = scene.ray_cast(depsgraph, origin, direction)
+        if not hit:
+            break
+        if not seen and unhittable_in_front(
+                view_layer, region, space, coord, view_origin, direction, (location - view_origin).dot(direction)):
+            return []
+        original = obj.original
+        if matrix != obj.matrix_world or not original.visible_get():
+            # an instance (collection instance, particles...) reports its source object, which
+            # is often not even in the view layer, the operator pick selects the instancer instead
+            log.debug("Instance of %s hit", original.name)
+            return []
+        if original not in seen:
+            seen.add(original)
+            # local view hides objects the ray still hits
+            if not original.hide_select and original.visible_get(viewport=space):
+                candidates.append(original)
+        origin = location + direction * RAY_EPSILON
+    return candidates
+
+
+'''Speculative pick, done by the gesture operator between the clicks of a double click'''
+
+class Speculation:
+    __slots__ = ('area', 'mouse_x', 'mouse_y', 'tolerance', 'candidates')
+
+    def __init__(self, area, mouse_x: int, mouse_y: int, tolerance: int, candidates: list):
+        self.area = area
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+        # pixels the release may be off, the gesture accepts the same wobble as a double click
+        self.tolerance = tolerance
+        self.candidates = candidates
+
+    def matches(self, area, mouse_x: int, mouse_y: int) -> bool:
+        return abs(self.mouse_x - mouse_x) <= self.tolerance and \
+            abs(self.mouse_y - mouse_y) <= self.tolerance and self.area == area
+
+
+# window pointer -> Speculation
+speculations = {}
+
+# the handlers dropping outdated speculations are only installed while there are any
+handlers_added = False
+
+
+def speculate(context: bpy.types.Context, window_pointer: int, area, mouse_x: int, mouse_y: int,
+              tolerance: int = 0):
+    ''' pick ahead of a possible double click, nothing is changed in the scene '''
+    speculation = speculations.get(window_pointer)
+    if speculation is not None and speculation.matches(area, mouse_x, mouse_y):
+        return
+    with stats.timed('speculative_pick'):
+        candidates = objects_under_cursor(context, area, mouse_x, mouse_y)
+    speculations[window_pointer] = Speculation(area, mouse_x, mouse_y, tolerance, candidates)
+    if not handlers_added:
+        add_handlers()
+
+
+def take_speculation(window_pointer: int, area, mouse_x: int, mouse_y: int):
+    ''' the candidates picked ahead near this position, None if there are none '''
+    speculation = speculations.pop(window_pointer, None)
+    if handlers_added and not speculations:
+        remove_handlers()
+    if speculation is not None and speculation.matches(area, mouse_x, mouse_y):
+        return speculation.candidates
+    return None
+
+
+def discard(window_pointer: int):
+    speculations.pop(window_pointer, None)
+    if handlers_added and not speculations:
+        remove_handlers()
+
+
+# The handlers are never removed from within a handler, Blender iterates the lists by
+# index and would skip the next one. take_speculation and discard remove them.
+
+@persistent
+def scene_changed(*args):
+    # objects may have moved, been hidden or deleted since the pick
+    if speculations:
+        speculations.clear()
+
+
+@persistent
+def data_reloaded(*args):
+    global unhittable_key
+    speculations.clear()
+    unhittable.clear()
+    unhittable_key = None
+
+
+_handlers = (
+    (bpy.app.handlers.depsgraph_update_post, scene_changed),
+    (bpy.app.handlers.undo_post, data_reloaded),
+    (bpy.app.handlers.redo_post, data_reloaded),
+    (bpy.app.handlers.load_post, data_reloaded),
+)
+
+
+def add_handlers():
+    global handlers_added
+    for handlers, handler in _handlers:
+        if handler not in handlers:
+            handlers.append(handler)
+    handlers_added = True
+    log.debug('picking handlers added')
+
+
+def remove_handlers():
+    global handlers_added
+    for handlers, handler in _handlers:
+        if handler in handlers:
+            handlers.remove(handler)
+    handlers_added = False
+
+
+def unregister():
+    remove_handlers()
+    data_reloaded()
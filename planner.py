@@ -0,0 +1,44 @@
+'''
+Plans the mode changes of a switch, so that no mode is left and entered again needlessly.
+'''
+
+# (ACTIVATE, object or None): apply the wanted selection and make the object active
+ACTIVATE = 'ACTIVATE'
+# (SET_MODE, mode): mode_set on the active object
+SET_MODE = 'SET_MODE'
+
+# modes several objects can be in at the same time
+MULTI_OBJECT_MODES = {'EDIT', 'POSE'}
+
+
+def plan_transition(active, active_mode, target, target_mode, extend_session=False) -> list:
+    '''
+    Steps from the active object in active_mode to target in target_mode.
+    Without a target only the selection is applied and the active object ends in OBJECT mode.
+    With extend_session the target joins a running multi object mode instead of replacing it.
+    '''
+    if target is None or target is active:
+        # mode_set switches between two modes of the same object directly
+        final_mode = 'OBJECT' if target is None else target_mode
+        steps = [(ACTIVATE, target)]
+        if active is not None and active_mode != final_mode:
+            steps.append((SET_MODE, final_mode))
+        return steps
+
+    if extend_session and active_mode == target_mode and target_mode in MULTI_OBJECT_MODES:
+        # entering the mode with the others still selected keeps their edit data
+        return [(ACTIVATE, target), (SET_MODE, target_mode)]
+
+    # the active object has to leave its mode before another object becomes active
+    steps = []
+    if active is not None and active_mode not in (None, 'OBJECT'):
+        steps.append((SET_MODE, 'OBJECT'))
+    steps.append((ACTIVATE, target))
+    if target_mode != 'OBJECT':
+        steps.append((SET_MODE, target_mode))
+    return steps
+
+
+def is_noop(steps: list, active) -> bool:
+    ''' True if the steps neither change a mode nor make another object than active active '''
+    return all(step == ACTIVATE and value in (None, active) for step, value in steps)
@@ -0,0 +1,95 @@
+'''
+cProfile capture of the next calls of a phase, e.g. the mode switch.
+
+Every captured call is written as a .pstats file plus a text summary of the top functions.
+'''
+import cProfile
+import os
+import pstats
+import time
+
+# functions listed in the text summary
+TOP_FUNCTIONS = 40
+
+# phase -> number of calls still to capture
+remaining = {}
+directory = ''
+# checked by the gesture operator per event, True while any phase is to be captured
+armed = False
+# files written by the current capture
+written = []
+# why the last capture stopped early, if it did
+error = None
+
+# the profile being recorded, a profiled call within another one is part of the outer profile
+_running = None
+
+
+def start(phases: dict, output_directory: str):
+    ''' phases maps phase name -> number of calls to capture '''
+    global armed, directory, error
+    remaining.clear()
+    remaining.update({phase: count for phase, count in phases.items() if count > 0})
+    directory = output_directory
+    written.clear()
+    error = None
+    armed = bool(remaining)
+
+
+def cancel():
+    global armed
+    remaining.clear()
+    armed = False
+
+
+def write(profile: cProfile.Profile, phase: str, seconds: float) -> str:
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"mmb_clicker_{phase}_{time.strftime('%Y%m%d-%H%M%S')}_{len(written):03d}")
+    profile.dump_stats(base + '.pstats')
+    with open(base + '.txt', 'w', encoding='utf-8') as file:
+        file.write(f"{phase}: {seconds * 1000.0:.3f} ms\n\n")
+        stats = pstats.Stats(profile, stream=file)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    written.append(base + '.pstats')
+    return base
+
+
+class profiled:
+    ''' context manager profiling the block if a capture of the phase is pending '''
+    __slots__ = ('phase', 'profile', 'start')
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.profile = None
+        self.start = 0.0
+
+    def __enter__(self):
+        global _running
+        if armed and _running is None and remaining.get(self.phase):
+            self.profile = _running = cProfile.Profile()
+            self.start = time.perf_counter()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _running, armed, error
+        profile = self.profile
+        if profile is None:
+            return False
+        profile.disable()
+        seconds = time.perf_counter() - self.start
+        _running = self.profile = None
+
+        count = remaining.get(self.phase, 0) - 1
+        if count > 0:
+            remaining[self.phase] = count
+        else:
+            remaining.pop(self.phase, None)
+            armed = bool(remaining)
+        try:
+            write(profile, self.phase, seconds)
+        except OSError as e:
+            # never fail the profiled call
+            error = str(e)
+            cancel()
+        return False
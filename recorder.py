@@ -0,0 +1,170 @@
+'''
+Recording and replay of the raw event stream reaching the gesture operator.
+
+Events are stored column wise in arrays and written as one binary file:
+magic, header length, JSON header, then the columns in COLUMNS order.
+'''
+import json
+import struct
+import sys
+import time
+from array import array
+
+from .gesture import GestureEngine
+
+MAGIC = b'MMBREC1\n'
+FILE_EXTENSION = '.mmbrec'
+
+# column name -> array typecode
+COLUMNS = (
+    ('timestamps', 'd'),
+    ('types', 'B'),
+    ('values', 'B'),
+    ('mouse_x', 'i'),
+    ('mouse_y', 'i'),
+    ('modifiers', 'B'),
+)
+
+SHIFT = 1
+CTRL = 2
+ALT = 4
+OSKEY = 8
+
+# the recording being captured by the gesture operator, None if not capturing
+active = None
+
+
+class RecordedEvent:
+    __slots__ = ('type', 'value', 'mouse_x', 'mouse_y', 'shift', 'ctrl', 'alt', 'oskey')
+
+    def __init__(self, type, value, mouse_x, mouse_y, modifiers):
+        self.type = type
+        self.value = value
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+        self.shift = bool(modifiers & SHIFT)
+        self.ctrl = bool(modifiers & CTRL)
+        self.alt = bool(modifiers & ALT)
+        self.oskey = bool(modifiers & OSKEY)
+
+
+class EventRecording:
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        # event type/value names, the columns store their index
+        self.type_names = []
+        self.value_names = []
+        self._type_codes = {}
+        self._value_codes = {}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _code(self, codes: dict, names: list, name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def append(self, event, now: float):
+        self.timestamps.append(now)
+        self.types.append(self._code(self._type_codes, self.type_names, event.type))
+        self.values.append(self._code(self._value_codes, self.value_names, event.value))
+        self.mouse_x.append(event.mouse_x)
+        self.mouse_y.append(event.mouse_y)
+        self.modifiers.append((SHIFT if event.shift else 0) | (CTRL if event.ctrl else 0) |
+                              (ALT if event.alt else 0) | (OSKEY if event.oskey else 0))
+
+    def events(self):
+        ''' yields (timestamp, event) '''
+        type_names = self.type_names
+        value_names = self.value_names
+        for index in range(len(self)):
+            yield self.timestamps[index], RecordedEvent(
+                type_names[self.types[index]], value_names[self.values[index]],
+                self.mouse_x[index], self.mouse_y[index], self.modifiers[index])
+
+    def save(self, filepath: str):
+        header = json.dumps({
+            'count': len(self),
+            'byteorder': sys.byteorder,
+            'types': self.type_names,
+            'values': self.value_names,
+        }).encode('utf-8')
+        with open(filepath, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<I', len(header)))
+            file.write(header)
+            for name, _ in COLUMNS:
+                getattr(self, name).tofile(file)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'EventRecording':
+        recording = cls()
+        with open(filepath, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an event recording: {filepath}")
+            try:
+                header_length, = struct.unpack('<I', file.read(4))
+                header = json.loads(file.read(header_length).decode('utf-8'))
+                count = header['count']
+                for name, _ in COLUMNS:
+                    column = getattr(recording, name)
+                    column.fromfile(file, count)
+                    if header['byteorder'] != sys.byteorder:
+                        column.byteswap()
+                recording.type_names = list(header['types'])
+                recording.value_names = list(header['values'])
+            except (EOFError, struct.error, KeyError, TypeError) as e:
+                # truncated or corrupt file
+                raise ValueError(f"Damaged event recording {filepath}: {e!r}") from e
+        recording._type_codes = {name: code for code, name in enumerate(recording.type_names)}
+        recording._value_codes = {name: code for code, name in enumerate(recording.value_names)}
+        return recording
+
+
+def start():
+    global active
+    active = EventRecording()
+
+
+def stop() -> EventRecording:
+    global active
+    recording, active = active, None
+    return recording
+
+
+def replay(recording: EventRecording, settings, realtime: bool = False, on_action=None) -> dict:
+    '''
+    Feed a recording through a fresh gesture engine, using the recorded timestamps
+    as its clock. With realtime the original pauses between events are reproduced.
+    on_action(action, event) is called for every recognized gesture.
+    Returns the number of occurrences per action.
+    '''
+    engine = GestureEngine(settings)
+    counts = {}
+    first = None
+    started = time.monotonic()
+    for timestamp, event in recording.events():
+        if realtime:
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        # the deadline timer would have fired before this event arrived
+        deadline = engine.deadline()
+        if deadline is not None and timestamp > deadline:
+            _count(counts, engine.expire(timestamp), event, on_action)
+        _, action = engine.feed(event, timestamp)
+        _count(counts, action, event, on_action)
+    return counts
+
+
+def _count(counts: dict, action, event, on_action):
+    if action is not None:
+        counts[action] = counts.get(action, 0) + 1
+        if on_action is not None:
+            on_action(action, event)
@@ -0,0 +1,34 @@
+import bpy
+
+
+class SelectionSnapshot:
+    ''' The selected objects at one point in time, as a set for O(1) membership tests '''
+    __slots__ = ('objects', 'active')
+
+    def __init__(self, context: bpy.types.Context):
+        self.objects = set(context.selected_objects)
+        self.active = context.view_layer.objects.active
+
+    def __contains__(self, obj) -> bool:
+        return obj in self.objects
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __repr__(self) -> str:
+        return f"SelectionSnapshot({len(self.objects)} objects, active {self.active})"
+
+
+def apply_selection(context: bpy.types.Context, wanted: set) -> int:
+    '''
+    Select exactly the objects in wanted, only objects whose state differs are touched.
+    Returns the number of changed objects.
+    '''
+    selected = set(context.selected_objects)
+    to_deselect = selected - wanted
+    to_select = wanted - selected
+    for obj in to_deselect:
+        obj.select_set(False)
+    for obj in to_select:
+        obj.select_set(True)
+    return len(to_deselect) + len(to_select)
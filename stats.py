@@ -0,0 +1,109 @@
+'''
+Latency collection per named phase.
+'''
+import functools
+import json
+import time
+from collections import deque
+
+# switched by the 'collect_stats' preference
+enabled = False
+
+# recent samples kept per phase for the percentiles
+SAMPLE_SIZE = 2048
+
+
+class PhaseHistogram:
+    def __init__(self):
+        self.count = 0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds: float):
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100.0))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(50) * 1000.0,
+            'p95_ms': self.percentile(95) * 1000.0,
+            'max_ms': self.max * 1000.0,
+        }
+
+
+# phase name -> PhaseHistogram, in order of first appearance
+phases = {}
+
+
+def set_enabled(value: bool):
+    global enabled
+    enabled = value
+
+
+def record(phase: str, seconds: float):
+    histogram = phases.get(phase)
+    if histogram is None:
+        histogram = phases[phase] = PhaseHistogram()
+    histogram.add(seconds)
+
+
+def reset():
+    phases.clear()
+
+
+def summaries() -> dict:
+    return {phase: histogram.summary() for phase, histogram in phases.items()}
+
+
+def export_json(filepath: str):
+    data = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'phases': summaries()
+    }
+    with open(filepath, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+
+
+class timed:
+    ''' context manager recording the duration of the block, if enabled '''
+    __slots__ = ('phase', 'start')
+
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled and self.start:
+            record(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+def timed_call(phase: str):
+    ''' decorator recording the duration of each call, if enabled '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(phase, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -1,10 +1,17 @@
 import bpy
+import time
 from bpy.types import Operator
 from bpy.props import (
     IntProperty
 )
 
-from . import log
+from . import cycles, log, modememory, objcache, picking, planner, profiler, stats, weightsync
+from .selection import SelectionSnapshot, apply_selection
+from .uisettings import ClickerPreferences
+
+
+# monotonic time of the last switch that needed an undo step, for coalescing
+last_switch_time = -1e9
 
 
 class OT_Clicker_Modeswitch(Operator):
@@ -17,267 +24,255 @@ class OT_Clicker_Modeswitch(Operator):
     mouse_y: IntProperty(default=-1)
     
     def execute(self, context):
-        area = self.get_clicked_area(context, self.mouse_x, self.mouse_y)
-        if area is not None:
-            self.handle_3d_view_click(context, self.mouse_x, self.mouse_y, area)
-            return {'FINISHED'}
-        return {'CANCELLED'}
-
-    # Mode switching definitions
-    mode_cycle_mesh = {
-        'OBJECT': 'EDIT',
-        'EDIT': 'WEIGHT_PAINT',
-        'WEIGHT_PAINT': 'EDIT'
-    }
-    mode_cycle_mesh_no_wp = {
-        'OBJECT': 'EDIT', 'EDIT': 'OBJECT', 'WEIGHT_PAINT': 'EDIT'
-    }
-    mode_cycle_arma = {
-        'OBJECT': 'POSE',
-        'POSE': 'EDIT',
-        'EDIT': 'POSE'
-    }
-    mode_cycle_curve = {
-        'OBJECT': 'EDIT'
-    }
-
-    mode_cycle_lattice = {
-        'OBJECT': 'EDIT'
-    }
-
-    mode_cycle_map_default = {
-        'MESH': mode_cycle_mesh,
-        'ARMATURE': mode_cycle_arma,
-        'CURVE': mode_cycle_curve,
-        'LATTICE': mode_cycle_lattice
-    }
-
-    mode_cycle_mesh_sculpt = {
-        'OBJECT': 'SCULPT',
-        'SCULPT': 'EDIT',
-        'EDIT': 'SCULPT'
-    }
-    mode_cycle_map_sculpt = {
-        'MESH': mode_cycle_mesh_sculpt,
-        'ARMATURE': mode_cycle_arma,
-        'CURVE': mode_cycle_curve,
-        'LATTICE': mode_cycle_lattice
-    }
-
-    mode_cycle_mesh_texpaint = {
-        'OBJECT': 'TEXTURE_PAINT',
-        'TEXTURE_PAINT': 'VERTEX_PAINT',
-        'VERTEX_PAINT': 'TEXTURE_PAINT'
-    }
-    mode_cycle_map_texpaint = {
-        'MESH': mode_cycle_mesh_texpaint,
-        'ARMATURE': mode_cycle_arma,
-        'CURVE': mode_cycle_curve,
-        'LATTICE': mode_cycle_lattice
-    }
-
-    workspaces = {
-        'SCULPT': mode_cycle_map_sculpt,
-        'TEXTURE_PAINT': mode_cycle_map_texpaint,
-        'DeFaUlT': mode_cycle_map_default
-    }
+        # not a decorator, Blender checks the argument count of execute()
+        with stats.timed('execute'), profiler.profiled('execute'):
+            area = self.get_clicked_area(context, self.mouse_x, self.mouse_y)
+            if area is not None:
+                self.handle_3d_view_click(context, self.mouse_x, self.mouse_y, area)
+                return {'FINISHED'}
+            return {'CANCELLED'}
 
     def get_armature_from_mod(self, context, mesh_obj):
-        for mod in mesh_obj.modifiers:
-            if mod.type == 'ARMATURE':
-                return mod.object
-
-    def switch_same_mode(self, context, current_mode, cycle_to_next=True, force_armature_remove=False):
-        cycle_map = self.workspaces.get(context.window.workspace.object_mode)
-        if not cycle_map:
-            cycle_map = self.workspaces.get('DeFaUlT')
-
-        cycle = cycle_map.get(context.active_object.type)
-        if cycle is None:
-            return  # lamps etc.
-        next = cycle.get(current_mode) if cycle_to_next else current_mode
-
-        log.info(f"{current_mode} -> {next}")
-
-        armature = None
-
-        if next == 'WEIGHT_PAINT':
-            armature = self.get_armature_from_mod(
-                context, context.active_object)
-            if armature:
-                armature.select_set(True)
-            else:
-                # no weightpainting, skip the step
-                log.info("Armature not found")
-                next = self.mode_cycle_mesh_no_wp.get(current_mode)
-
-        if next is not None:
-            bpy.ops.object.mode_set(mode=next)
-
-        # sync heatmap displayed (active vertex group) with selected bone
-        if armature and next == 'WEIGHT_PAINT' and context.active_pose_bone:
-            name = context.active_pose_bone.name
-            obj = context.active_object
-            if obj is not None:
-                vgroups = {}
-                for vgroup in obj.vertex_groups:
-                    if vgroup.name == name:
-                        obj.vertex_groups.active_index = vgroup.index
-                        break
-
-        # deselect armature after weight paint
-        if force_armature_remove or (current_mode == 'WEIGHT_PAINT' and next != 'WEIGHT_PAINT'):
-            armature = self.get_armature_from_mod(
-                context, context.active_object)
-            if armature:
-                armature.select_set(False)
+        return objcache.armature_of(mesh_obj)
+
+    def resolve_next_mode(self, context, obj, current_mode, cycle_to_next=True):
+        ''' mode to switch obj to, None if its type has no cycle or the mode isn't in it '''
+        next = cycles.next_mode(context.window.workspace.object_mode, obj, current_mode, cycle_to_next,
+                                lambda obj: self.get_armature_from_mod(context, obj))
+        log.info("%s -> %s", current_mode, next)
+        return next
+
+    def push_undo(self, context, current_mode, next_mode) -> bool:
+        ''' push an undo step unless the last switch was within the coalesce window '''
+        global last_switch_time
+        now = time.monotonic()
+        coalesce = ClickerPreferences.get_instance(context).undo_coalesce_time
+        in_burst = now - last_switch_time < coalesce
+        last_switch_time = now
+        if in_burst:
+            log.info("Switch within %.2fs of the last one, sharing its undo step", coalesce)
+            return False
+        if bpy.ops.ed.undo_push:
+            with stats.timed('undo_push'):
+                bpy.ops.ed.undo_push(message=f'Clicker {current_mode} to {next_mode}')
+            return True
+        return False
+
+    @stats.timed_call('run_plan')
+    def run_plan(self, context, steps: list, wanted: set, armature):
+        for step, value in steps:
+            if step == planner.ACTIVATE:
+                with stats.timed('selection_restore'):
+                    changed = apply_selection(context, wanted)
+                log.info("Selection changes: %d", changed)
+                if value is not None and context.view_layer.objects.active != value:
+                    context.view_layer.objects.active = value
+                # armature stays selected in weight paint for bone selection
+                if armature is not None:
+                    armature.select_set(True)
+            elif step == planner.SET_MODE:
+                with stats.timed('mode_set'):
+                    bpy.ops.object.mode_set(mode=value)
 
     ''' perform a scripted click at mouse position in the given area '''
 
+    @stats.timed_call('select_pick')
     def click_in_3d_view(self, area, mouse_x: int, mouse_y: int):
         bpy.ops.view3d.select(
             location=(mouse_x - area.x, mouse_y - area.y), deselect_all=True, object=True)
 
-    def get_clicked_area(self, context, mouse_x: int, mouse_y: int):
-        for area in context.screen.areas:
-            if area.type == 'VIEW_3D':
-                if mouse_x >= area.x and mouse_x < area.x + area.width and \
-                        mouse_y >= area.y and mouse_y < area.y + area.height:
-                    return area
-
-    def handle_3d_view_click(self, context, mouse_x: int, mouse_y: int, area):
-        current_mode = context.active_object.mode if context.active_object else None
-        current_ob = context.active_object if len(
-            context.selected_objects) != 0 else None
-
-        log.info(
-            f"Current: {current_ob.name if current_ob is not None else None}, " +
-            f"type {current_ob.type if current_ob is not None else None}, mode {current_mode}")
-        
-        if bpy.ops.ed.undo_push:
-            bpy.ops.ed.undo_push(message=f'Clicker {current_mode} to ?')
-        
+    def preferred_candidate(self, candidates: list, current_ob, current_mode):
+        # prefer the currently selected for switching
+        if current_mode == 'OBJECT' and current_ob in candidates:
+            return current_ob
+        return candidates[0]
 
+    def pick_with_select(self, context, area, mouse_x: int, mouse_y: int, current_ob, current_mode):
         # switch to object mode if not in Edit mode, at least in pose mode the click doesn't work otherwise
-        if context.active_object and context.active_object.mode != 'EDIT':
-            bpy.ops.object.mode_set(mode='OBJECT')
-
-        selected_objects = list(context.selected_objects)  # shallow copy
-        log.info(f"Initially selected: {selected_objects}")
+        if context.active_object and context.active_object.mode not in ('EDIT', 'OBJECT'):
+            with stats.timed('mode_set_object'):
+                bpy.ops.object.mode_set(mode='OBJECT')
 
         # Deselect everything because otherwise Blender does its toggling thing
-        if context.view_layer.objects.active:
-            context.view_layer.objects.active.select_set(False)
+        with stats.timed('selection_clear'):
+            if context.view_layer.objects.active:
+                context.view_layer.objects.active.select_set(False)
 
-        for obj in context.selected_objects:
-            obj.select_set(False)
+            apply_selection(context, set())
 
         self.click_in_3d_view(area, mouse_x, mouse_y)
 
-        log.info(f"Selected after click: {context.selected_objects}")
-
-        log.info(
-            f"Clicked: {context.selected_objects[0].name if len(context.selected_objects) > 0 else None}, " +
-            f"type {context.selected_objects[0].type if len(context.selected_objects) > 0 else None}")
-
-        new_ob = None
-
         if current_mode == 'OBJECT' and current_ob is not None and current_ob != context.active_object:
-            # prefer the currently selected for switching
             # click on the same spot 5 times and see if the active object at entry is among them
             # may not work if more than 5 overlapping objects
             for _ in range(5):
                 self.click_in_3d_view(area, mouse_x, mouse_y)
                 if current_ob == context.active_object:
-                    new_ob = current_ob
-                    break
+                    return current_ob
 
-        if new_ob is None:
-            new_ob = context.selected_objects[0] if len(
-                context.selected_objects) > 0 else None
+        return context.selected_objects[0] if len(
+            context.selected_objects) > 0 else None
 
-        if context.active_object and context.active_object.mode != 'OBJECT':
-            bpy.ops.object.mode_set(mode='OBJECT')
+    def get_clicked_area(self, context, mouse_x: int, mouse_y: int):
+        for area in context.screen.areas:
+            if area.type == 'VIEW_3D':
+                if mouse_x >= area.x and mouse_x < area.x + area.width and \
+                        mouse_y >= area.y and mouse_y < area.y + area.height:
+                    return area
 
-        ws = context.window.workspace
-        LASTMODE_PROP = 'clicker_last_modes'
-        # Ensure the last mode workspace property exists
-        if LASTMODE_PROP not in ws:
-            ws[LASTMODE_PROP] = {}
+    def handle_3d_view_click(self, context, mouse_x: int, mouse_y: int, area):
+        snapshot = SelectionSnapshot(context)
+        log.info("Initially selected: %s", snapshot)
+
+        current_mode = context.active_object.mode if context.active_object else None
+        current_ob = context.active_object if len(snapshot) != 0 else None
 
-        next = ws[LASTMODE_PROP].get(
-            new_ob.type) if new_ob is not None else None
-        log.info(f"LastMode: {next}")
+        if log.info_enabled:
+            log.info("Current: %s, type %s, mode %s",
+                     current_ob.name if current_ob is not None else None,
+                     current_ob.type if current_ob is not None else None, current_mode)
 
-        # restore additional selected objects if one of them was the new target
-        if (new_ob in selected_objects or new_ob is None) and len(selected_objects) > 1:
-            for obj in selected_objects:
-                obj.select_set(True)
+        with stats.timed('pick'):
+            candidates = picking.take_speculation(context.window.as_pointer(), area, mouse_x, mouse_y)
+            if candidates is None:
+                candidates = picking.objects_under_cursor(context, area, mouse_x, mouse_y)
+            else:
+                log.info("Using the pick made during the gesture")
+
+        undo_pushed = False
+        if candidates:
+            new_ob = self.preferred_candidate(candidates, current_ob, current_mode)
+        else:
+            # nothing hit, or an armature, empty etc. may be in front, let Blender pick
+            if current_mode not in (None, 'EDIT', 'OBJECT'):
+                # the pick leaves the mode before the result is known
+                undo_pushed = self.push_undo(context, current_mode, '?')
+            new_ob = self.pick_with_select(context, area, mouse_x, mouse_y, current_ob, current_mode)
+
+        if log.info_enabled:
+            log.info("Candidates: %s", candidates)
+            log.info("Clicked: %s, type %s",
+                     new_ob.name if new_ob is not None else None,
+                     new_ob.type if new_ob is not None else None)
+
+        ws = context.window.workspace
+        next = modememory.last_mode(ws, new_ob) if new_ob is not None else None
+        log.info("LastMode: %s", next)
+
+        # decide on the target object and the mode to cycle from, nothing is changed yet
+        target_ob = new_ob
+        from_mode, cycle_to_next = 'OBJECT', True
 
         # clicked on nothing - select last selected in object mode
         if new_ob is None:
             log.info("New ob is None, switch to Object mode")
-
-            if current_ob is not None and not current_ob.hide_get():
-                current_ob.select_set(True)
-
-                context.view_layer.objects.active = current_ob
-                self.switch_same_mode(context, 'OBJECT', cycle_to_next=False,
-                                      force_armature_remove=current_mode == 'WEIGHT_PAINT')
+            target_ob = current_ob if current_ob is not None and not current_ob.hide_get() else None
+            cycle_to_next = False
 
         # from None to an object, restore last saved mode
         elif current_ob is None:
-            log.info(f"Previously None selected, restore from last mode")
-            context.view_layer.objects.active = new_ob
-
+            log.info("Previously None selected, restore from last mode")
             if next:
-                self.switch_same_mode(context, next, cycle_to_next=False)
-            else:
-                self.switch_same_mode(context, 'OBJECT')
+                from_mode, cycle_to_next = next, False
 
         # clicked on selected, switch mode
         elif new_ob == current_ob:
-            log.info(f"Clicked on same object, cycle mode")
-            context.view_layer.objects.active = new_ob
-            new_ob.select_set(True)
-
-            if current_mode == 'OBJECT':
-                if next:
-                    log.info(f"Switch to mode: {next}")
-                    self.switch_same_mode(context, next, cycle_to_next=False)
-                else:
-                    self.switch_same_mode(context, current_mode)
+            log.info("Clicked on same object, cycle mode")
+            if current_mode == 'OBJECT' and next:
+                log.info("Switch to mode: %s", next)
+                from_mode, cycle_to_next = next, False
             else:
-                self.switch_same_mode(context, current_mode)
+                from_mode = current_mode
 
         # clicked on other object of same type, enter same mode
         elif current_ob.type == new_ob.type:
-            log.info(
-                f"Different object but same type, select with same mode")
-            context.view_layer.objects.active = new_ob
-
+            log.info("Different object but same type, select with same mode")
             if current_mode == 'OBJECT':
                 if next:
-                    log.info(f"Switch to mode: {next}")
-                    self.switch_same_mode(context, next, cycle_to_next=False)
-                else:
-                    self.switch_same_mode(context, current_mode)
+                    log.info("Switch to mode: %s", next)
+                    from_mode, cycle_to_next = next, False
             else:
-                self.switch_same_mode(context, current_mode,
-                                      cycle_to_next=current_mode == 'OBJECT')
+                from_mode, cycle_to_next = current_mode, False
 
         # different object - enter last known mode
         else:
-            log.info(
-                f"Clicked on other object type, switch according to its last mode")
-            context.view_layer.objects.active = new_ob
-
+            log.info("Clicked on other object type, switch according to its last mode")
             if next:
-                log.info(f"Switch to mode: {next}")
-                self.switch_same_mode(context, next, cycle_to_next=False)
-            else:
-                self.switch_same_mode(context, 'OBJECT')
+                log.info("Switch to mode: %s", next)
+                from_mode, cycle_to_next = next, False
+
+        next_mode = None
+        if target_ob is not None:
+            next_mode = self.resolve_next_mode(context, target_ob, from_mode, cycle_to_next)
+
+        prefs = ClickerPreferences.get_instance(context)
+
+        # the selected objects of the target's type enter the mode together, in one mode_set
+        batch = (prefs.batch_selection and target_ob is not None and
+                 next_mode in planner.MULTI_OBJECT_MODES)
+
+        # hop into the running edit session instead of leaving it
+        extend_session = (
+            new_ob is not None and current_ob is not None and new_ob != current_ob and
+            current_ob.type == new_ob.type and current_mode in planner.MULTI_OBJECT_MODES and
+            (prefs.edit_hop == 'EXTEND' or batch))
+
+        # keep additional selected objects if one of them was the new target
+        if extend_session or ((new_ob in snapshot or new_ob is None) and len(snapshot) > 1):
+            wanted = set(snapshot.objects)
+        elif batch:
+            wanted = {obj for obj in snapshot.objects if obj.type == target_ob.type}
+        else:
+            wanted = set()
+        if target_ob is not None:
+            wanted.add(target_ob)
+
+        armature = None
+        if next_mode == 'WEIGHT_PAINT':
+            armature = self.get_armature_from_mod(context, target_ob)
+
+        active = context.active_object
+        steps = planner.plan_transition(
+            active, active.mode if active else None, target_ob, next_mode or 'OBJECT', extend_session)
+        log.info("Plan: %s", steps)
+
+        if planner.is_noop(steps, snapshot.active) and active == snapshot.active:
+            log.info("Nothing to switch, no undo step")
+        elif not undo_pushed:
+            if not candidates:
+                # undo has to see the state from before the view3d.select pick
+                apply_selection(context, snapshot.objects)
+                context.view_layer.objects.active = snapshot.active
+            self.push_undo(context, current_mode, next_mode or 'OBJECT')
+
+        self.run_plan(context, steps, wanted, armature)
+
+        # sync heatmap displayed (active vertex group) with selected bone
+        if armature and context.active_pose_bone:
+            weightsync.sync_active_group(target_ob, context.active_pose_bone.name)
+
+        # deselect armature after weight paint
+        if target_ob is not None and (
+                (new_ob is None and current_mode == 'WEIGHT_PAINT') or
+                (from_mode == 'WEIGHT_PAINT' and next_mode != 'WEIGHT_PAINT')):
+            armature = self.get_armature_from_mod(context, target_ob)
+            if armature:
+                armature.select_set(False)
 
         # store last mode depending on workspace
         if context.active_object and context.active_object.mode != 'OBJECT':
-            ws[LASTMODE_PROP][context.active_object.type] = context.active_object.mode
+            modememory.remember(ws, context.active_object, context.active_object.mode)
+
+
+def register():
+    bpy.utils.register_class(OT_Clicker_Modeswitch)
+    objcache.register(__name__)
+    modememory.setup_preferences_cb()
+    modememory.register()
+
+
+def unregister():
+    modememory.unregister()
+    modememory.remove_preferences_cb()
+    objcache.unregister(__name__)
+    bpy.utils.unregister_class(OT_Clicker_Modeswitch)
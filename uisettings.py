@@ -1,12 +1,16 @@
 import bpy
-from bpy.types import AddonPreferences
+from bpy.types import AddonPreferences, PropertyGroup, UIList
 
 from bpy.props import (
+    BoolProperty,
+    CollectionProperty,
+    EnumProperty,
     IntProperty,
-    FloatProperty
+    FloatProperty,
+    StringProperty
 )
 
-from . import log
+from . import cycles, log, profiler, recorder, stats
 
 
 def property_updated(self, variable_name):
@@ -14,9 +18,63 @@ def property_updated(self, variable_name):
         for callback in ClickerPreferences.callbacks.get(variable_name, []):
             callback(getattr(self, variable_name))
     else:
-        log.warning("No callback set for: " + variable_name)
+        log.warning("No callback set for: %s", variable_name)
     pass
 
+def enum_items(names) -> list:
+    return [(name, name.replace('_', ' ').title(), '') for name in names]
+
+
+def cycle_rule_updated(self, context):
+    property_updated(ClickerPreferences.get_instance(context), 'cycle_rules')
+
+
+class ModeCycleRule(PropertyGroup):
+    workspace_mode: EnumProperty(
+        name="Workspace Mode",
+        description="Only use the rule in this workspace mode, Any for all others",
+        items=enum_items(cycles.WORKSPACE_MODES),
+        update=cycle_rule_updated
+    )
+    object_type: EnumProperty(
+        name="Object Type", items=enum_items(cycles.OBJECT_TYPES), update=cycle_rule_updated)
+    from_mode: EnumProperty(
+        name="From", items=enum_items(cycles.MODES), update=cycle_rule_updated)
+    to_mode: EnumProperty(
+        name="To", items=enum_items(cycles.MODES), update=cycle_rule_updated)
+    armature: EnumProperty(
+        name="Armature",
+        description="Only use the rule for objects with or without an armature modifier",
+        items=[
+            (cycles.ANY, 'Any', ''),
+            (cycles.WITH, 'With Armature', ''),
+            (cycles.WITHOUT, 'Without Armature', '')
+        ],
+        update=cycle_rule_updated
+    )
+
+    # in the order of the rule tuples in cycles
+    fields = ('workspace_mode', 'object_type', 'from_mode', 'to_mode', 'armature')
+
+    def as_tuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def set_from(self, values: tuple):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+
+class CLICKER_UL_cycle_rules(UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, 'workspace_mode', text="")
+        row.prop(item, 'object_type', text="")
+        row.prop(item, 'from_mode', text="")
+        row.label(icon='FORWARD')
+        row.prop(item, 'to_mode', text="")
+        row.prop(item, 'armature', text="")
+
+
 class ClickerPreferences(AddonPreferences):
     bl_idname = __package__
     
@@ -33,12 +91,29 @@ class ClickerPreferences(AddonPreferences):
         update=lambda self, ctx: property_updated(self, 'debug_level')
     )
 
+    log_file_path: StringProperty(
+        name="Log File",
+        description="Also write the log to this file, empty for the console only",
+        default="",
+        subtype='FILE_PATH',
+        update=lambda self, ctx: property_updated(self, 'log_file_path')
+    )
+
+    log_file_max_kb: IntProperty(
+        name="Max Size KB",
+        description="Size at which the log file is rotated, the last 3 files are kept",
+        default=1024,
+        min=16,
+        update=lambda self, ctx: property_updated(self, 'log_file_max_kb')
+    )
+
     click_detection_time: FloatProperty(
         name="Click Timeout",
         description="Double click detection time",
         default=0.5,
         min=0.1,
-        soft_max=5
+        soft_max=5,
+        update=lambda self, ctx: property_updated(self, 'click_detection_time')
     )
 
     drag_detection_px: IntProperty(
@@ -46,9 +121,100 @@ class ClickerPreferences(AddonPreferences):
         description="Move tolerance in pixels during click",
         default=10,
         min=0,
-        soft_max=50
+        soft_max=50,
+        update=lambda self, ctx: property_updated(self, 'drag_detection_px')
     )
     
+    adaptive_timing: BoolProperty(
+        name="Adaptive Timing",
+        description="Lower the click timeout and drag detection to what your double clicks need, "
+                    "never above the values set here",
+        default=False,
+        update=lambda self, ctx: property_updated(self, 'adaptive_timing')
+    )
+
+    adaptive_percentile: FloatProperty(
+        name="Percentile",
+        description="Share of the observed double clicks the adapted values have to accept",
+        default=95.0,
+        min=50.0,
+        max=100.0,
+        subtype='PERCENTAGE',
+        update=lambda self, ctx: property_updated(self, 'adaptive_percentile')
+    )
+
+    edit_hop: bpy.props.EnumProperty(
+        name="Switching Objects in Edit Mode",
+        description="What happens when double clicking another object of the same type in edit or pose mode",
+        items=[
+            ('REPLACE', 'Replace', 'Leave the mode on the previous object and enter it on the clicked one'),
+            ('EXTEND', 'Add to Session', 'Add the clicked object, the previous objects stay in the mode')
+        ],
+        default='REPLACE'
+    )
+
+    batch_selection: BoolProperty(
+        name="Switch Whole Selection",
+        description="Double clicking an object switches the other selected objects of its type along with it, "
+                    "for edit and pose mode",
+        default=False
+    )
+
+    mode_history_size: IntProperty(
+        name="Remembered Objects",
+        description="Number of objects whose last mode is remembered, older ones fall back to the last mode of their type",
+        default=1000,
+        min=0,
+        update=lambda self, ctx: property_updated(self, 'mode_history_size')
+    )
+
+    undo_coalesce_time: FloatProperty(
+        name="Undo Coalescing",
+        description="Switches following each other within this time share one undo step, 0 gives every switch its own",
+        default=0.0,
+        min=0.0,
+        soft_max=10,
+        unit='TIME_ABSOLUTE'
+    )
+
+    weight_paint_follow_bone: BoolProperty(
+        name="Heatmap Follows Bone",
+        description="In weight paint mode, make the vertex group of the active bone the active group",
+        default=False,
+        update=lambda self, ctx: property_updated(self, 'weight_paint_follow_bone')
+    )
+
+    cycle_rules: CollectionProperty(type=ModeCycleRule)
+    cycle_rules_index: IntProperty()
+
+    collect_stats: BoolProperty(
+        name="Collect Timings",
+        description="Measure the time spent per event and per mode switch phase",
+        default=False,
+        update=lambda self, ctx: property_updated(self, 'collect_stats')
+    )
+
+    profile_directory: StringProperty(
+        name="Profile Directory",
+        description="Where profiles are written, empty for the temporary directory",
+        default="",
+        subtype='DIR_PATH'
+    )
+
+    profile_count: IntProperty(
+        name="Switches",
+        description="Number of mode switches to profile",
+        default=5,
+        min=1,
+        soft_max=50
+    )
+
+    profile_invoke: BoolProperty(
+        name="Include Gesture Events",
+        description="Also profile as many calls of the gesture operator",
+        default=False
+    )
+
     @staticmethod
     def get_instance(context: bpy.types.Context = None) -> 'ClickerPreferences':
         prefs = (
@@ -83,4 +249,65 @@ class ClickerPreferences(AddonPreferences):
         layout: bpy.types.UILayout = self.layout
         layout.prop(self, 'click_detection_time')
         layout.prop(self, 'drag_detection_px')
-        layout.prop(self, 'debug_level')
+        row = layout.row()
+        row.prop(self, 'adaptive_timing')
+        row.prop(self, 'adaptive_percentile')
+        layout.prop(self, 'edit_hop')
+        layout.prop(self, 'batch_selection')
+        layout.prop(self, 'undo_coalesce_time')
+        layout.prop(self, 'mode_history_size')
+
+        box = layout.box()
+        row = box.row()
+        row.label(text="Mode Cycles")
+        if not self.cycle_rules:
+            row.label(text="Built-in")
+            row.operator('wm.clicker_cycle_rules_reset', text="Customize")
+        else:
+            row.operator('wm.clicker_cycle_rules_reset', text="Reset")
+            row = box.row()
+            row.template_list('CLICKER_UL_cycle_rules', '', self, 'cycle_rules', self, 'cycle_rules_index')
+            col = row.column(align=True)
+            col.operator('wm.clicker_cycle_rule_add', icon='ADD', text="")
+            col.operator('wm.clicker_cycle_rule_remove', icon='REMOVE', text="")
+        layout.prop(self, 'weight_paint_follow_bone')
+        row = layout.row()
+        row.prop(self, 'debug_level')
+        row.operator('wm.clicker_dump_trace')
+        row = layout.row()
+        row.prop(self, 'log_file_path')
+        row.prop(self, 'log_file_max_kb')
+
+        row = layout.row()
+        if recorder.active is None:
+            row.operator('wm.clicker_record_start', icon='REC')
+        else:
+            row.operator('wm.clicker_record_stop', icon='PAUSE')
+        row.operator('wm.clicker_replay', icon='PLAY')
+
+        box = layout.box()
+        row = box.row()
+        row.prop(self, 'collect_stats')
+        row.operator('wm.clicker_export_stats', icon='EXPORT')
+        row.operator('wm.clicker_reset_stats')
+        row = box.row()
+        row.prop(self, 'profile_directory')
+        row = box.row()
+        row.prop(self, 'profile_count')
+        row.prop(self, 'profile_invoke')
+        if profiler.armed:
+            row.operator('wm.clicker_profile_cancel', icon='PAUSE')
+        else:
+            row.operator('wm.clicker_profile_start', icon='TIME')
+        if profiler.written or profiler.error:
+            box.label(text=profiler.error or f"{len(profiler.written)} profiles written")
+        if stats.phases:
+            grid = box.grid_flow(row_major=True, columns=5, even_columns=True)
+            for header in ('Phase', 'Count', 'p50 ms', 'p95 ms', 'max ms'):
+                grid.label(text=header)
+            for phase, summary in stats.summaries().items():
+                grid.label(text=phase)
+                grid.label(text=str(summary['count']))
+                grid.label(text=f"{summary['p50_ms']:.3f}")
+                grid.label(text=f"{summary['p95_ms']:.3f}")
+                grid.label(text=f"{summary['max_ms']:.3f}")
@@ -0,0 +1,72 @@
+'''
+Keeps the active vertex group (the weight paint heatmap) in sync with the active bone.
+'''
+import bpy
+from bpy.app.handlers import persistent
+
+from . import log, objcache
+from .uisettings import ClickerPreferences
+
+# msgbus owner of the active bone subscription
+_owner = object()
+follow_enabled = False
+
+
+def sync_active_group(obj, bone_name: str) -> bool:
+    index = objcache.vertex_group_index(obj, bone_name)
+    if index is None:
+        return False
+    if obj.vertex_groups.active_index != index:
+        obj.vertex_groups.active_index = index
+    return True
+
+
+def active_bone_changed():
+    obj = bpy.context.active_object
+    if obj is None or obj.mode != 'WEIGHT_PAINT':
+        return
+    armature = objcache.armature_of(obj)
+    if armature is None or armature.type != 'ARMATURE':
+        return
+    bone = armature.data.bones.active
+    if bone is not None and sync_active_group(obj, bone.name):
+        log.debug("Heatmap follows bone %s", bone.name)
+
+
+def subscribe():
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.ArmatureBones, 'active'),
+        owner=_owner,
+        args=(),
+        notify=active_bone_changed)
+
+
+@persistent
+def load_post(*args):
+    # file loading drops all msgbus subscriptions
+    if follow_enabled:
+        subscribe()
+
+
+def follow_bone_cb(value: bool):
+    global follow_enabled
+    follow_enabled = value
+    bpy.msgbus.clear_by_owner(_owner)
+    if value:
+        objcache.register(__name__)
+        subscribe()
+    else:
+        objcache.unregister(__name__)
+
+
+def setup_preferences_cb():
+    ClickerPreferences.register_callback('weight_paint_follow_bone', follow_bone_cb)
+    if load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(load_post)
+
+
+def remove_preferences_cb():
+    ClickerPreferences.unregister_callback('weight_paint_follow_bone', follow_bone_cb)
+    if load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post)
+    follow_bone_cb(False)